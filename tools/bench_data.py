@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+from read_data import Reader, DECODERS, setup_logging
+from crsf_crc import crc8, verify_crc_batch
+from crsf_codes import CrsfFrameType
+from crsf_synth import StreamGenerator
+
+
+REPEAT = 3
+CRC_BATCH = 1024  # frames per verify_crc_batch call
+
+
+def best_time(func, repeat=REPEAT):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_memory(func):
+    """Peak of Python allocations while running ``func``, in bytes."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def read_all(path, reader_type, decode=True):
+    def run():
+        reader = Reader(reader_type, path=path, skip_types=None if decode else range(256))
+        count = 0
+        for frame in reader.read_frames():
+            if decode:
+                frame.payload.fields
+            count += 1
+        reader.close()
+        # Without decoding every frame is filtered out right after the CRC check
+        return count + reader.frames_filtered
+    return run
+
+
+def bench_reader(path, reader_type, decode=True, repeat=REPEAT):
+    size = os.path.getsize(path)
+    run = read_all(path, reader_type, decode)
+    frames = run()
+    seconds = best_time(run, repeat)
+    return {
+        'frames': frames,
+        'seconds': seconds,
+        'frames_per_second': frames / seconds,
+        'megabytes_per_second': size / seconds / 1e6,
+        'peak_memory': peak_memory(run),
+    }
+
+
+def sample_frames(path):
+    """Raw frames with valid CRC found in the stream."""
+    reader = Reader('mmap', path=path)
+    frames = [bytes(frame.raw) for frame in reader.read_frames()]
+    reader.close()
+    return frames
+
+
+def bench_crc(frames, repeat=REPEAT):
+    data = b''.join(frames)
+    spans = []
+    offset = 0
+    for frame in frames:
+        spans.append((offset, offset + len(frame)))
+        offset += len(frame)
+
+    def single():
+        for frame in frames:
+            crc8(memoryview(frame)[2:-1])
+
+    def batch():
+        for start in range(0, len(spans), CRC_BATCH):
+            verify_crc_batch(data, spans[start:start + CRC_BATCH])
+
+    result = {}
+    for name, func in [('crc8', single), ('crc_batch', batch)]:
+        seconds = best_time(func, repeat)
+        result[name] = {
+            'frames': len(frames),
+            'seconds': seconds,
+            'frames_per_second': len(frames) / seconds,
+            'megabytes_per_second': len(data) / seconds / 1e6,
+        }
+    return result
+
+
+def decodes(decode, payload):
+    try:
+        decode(payload)
+        return True
+    except Exception:
+        return False
+
+
+def bench_decoders(frames, repeat=REPEAT):
+    """Decoders are measured on payloads they can decode, e.g. MSP continuation chunks are left out."""
+    payloads = {}
+    for frame in frames:
+        payloads.setdefault(frame[2], []).append(frame[3:-1])
+
+    result = {}
+    for type_byte, samples in sorted(payloads.items()):
+        decode = DECODERS.get(type_byte)
+        if decode is None:
+            continue
+        samples = [i for i in samples if decodes(decode, i)]
+        if not samples:
+            continue
+
+        def run():
+            for payload in samples:
+                decode(payload)
+
+        seconds = best_time(run, repeat)
+        result["decode_{}".format(CrsfFrameType(type_byte).name).lower()] = {
+            'frames': len(samples),
+            'seconds': seconds,
+            'frames_per_second': len(samples) / seconds,
+            'peak_memory': peak_memory(run),
+        }
+    return result
+
+
+def run_benchmarks(path, repeat=REPEAT):
+    results = {}
+    for reader_type in ['file', 'mmap']:
+        results['reader_%s' % reader_type] = bench_reader(path, reader_type, True, repeat)
+        results['reader_%s_scan' % reader_type] = bench_reader(path, reader_type, False, repeat)
+
+    frames = sample_frames(path)
+    results.update(bench_crc(frames, repeat))
+    results.update(bench_decoders(frames, repeat))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Names of benchmarks whose frame rate dropped more than ``threshold`` (0.1 - 10%)."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if not base or not base['frames_per_second']:
+            continue
+        ratio = result['frames_per_second'] / base['frames_per_second']
+        LOG.info("%-40s %12.0f frames/s  %6.2fx" % (name, result['frames_per_second'], ratio))
+        if ratio < 1 - threshold:
+            regressions.append(name)
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmarks for Crossfire protocol tools')
+    parser.add_argument("--path", action="store", help="Binary log to use instead of synthetic stream")
+    parser.add_argument("--size", action="store", type=int, default=4, help="Synthetic stream size, MB")
+    parser.add_argument("--seed", action="store", type=int, default=0, help="Synthetic stream seed")
+    parser.add_argument("--noise", action="store", type=float, default=0.01, help="Garbage probability per frame")
+    parser.add_argument("--corrupt", action="store", type=float, default=0.001, help="Bad CRC probability per frame")
+    parser.add_argument("--repeat", action="store", type=int, default=REPEAT, help="Runs per benchmark, best is kept")
+    parser.add_argument("--output", action="store", help="Write results to JSON file")
+    parser.add_argument("--compare", action="store", help="Baseline JSON file")
+    parser.add_argument("--threshold", action="store", type=float, default=0.1, help="Allowed slowdown, 0.1 - 10%%")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    LOG = setup_logging()
+
+    path = args.path
+    if path is None:
+        handle, path = tempfile.mkstemp(suffix='.binlog')
+        os.close(handle)
+        StreamGenerator(args.seed, noise=args.noise, corrupt=args.corrupt).write(path, args.size * 1000 * 1000)
+        LOG.info("Synthetic stream: %s bytes" % os.path.getsize(path))
+
+    # Reader shares the logger, bad CRC frames are expected in the synthetic stream
+    LOG.setLevel(logging.CRITICAL)
+    try:
+        results = run_benchmarks(path, args.repeat)
+    finally:
+        LOG.setLevel(logging.INFO)
+        if args.path is None:
+            os.remove(path)
+
+    report = {
+        'meta': {
+            'time': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'source': args.path or 'synthetic',
+            'size': args.size,
+            'seed': args.seed,
+            'noise': args.noise,
+            'corrupt': args.corrupt,
+        },
+        'results': results,
+    }
+
+    for name, result in sorted(results.items()):
+        LOG.info("%-40s %12.0f frames/s" % (name, result['frames_per_second']))
+
+    if args.output:
+        with open(args.output, 'w') as target:
+            json.dump(report, target, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as source:
+            baseline = json.load(source)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            LOG.error("Regressions: %s" % ", ".join(regressions))
+            sys.exit(1)
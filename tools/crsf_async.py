@@ -0,0 +1,125 @@
+import time
+import asyncio
+
+from read_data import Reader
+
+
+QUEUE_SIZE = 1024
+
+
+class Subscription(object):
+    """Async iterator over frames for a single consumer."""
+
+    def __init__(self, reader, maxsize=QUEUE_SIZE):
+        self.reader = reader
+        self.queue = asyncio.Queue(maxsize)
+        self.frames_dropped = 0
+
+    def put(self, frame):
+        # Slow consumer loses the oldest frames, the UART is never stalled
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.frames_dropped += 1
+        self.queue.put_nowait(frame)
+
+    def close(self):
+        if self in self.reader.subscribers:
+            self.reader.subscribers.remove(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        frame = await self.queue.get()
+        if frame is None:
+            raise StopAsyncIteration
+        return frame
+
+
+class AsyncReader(object):
+    """
+    Non-blocking serial frame stream.
+
+        async for frame in AsyncReader(port, baudrate):
+            ...
+
+    Bytes are read from the event loop when the port becomes readable
+    (or from an executor thread where the loop can not watch the port),
+    decoded incrementally and put into a bounded queue of every subscriber.
+    """
+
+    def __init__(self, path, baudrate=420000, raw_log_path=None, queue_size=QUEUE_SIZE):
+        self.reader = Reader('serial', path=path, baudrate=baudrate, raw_log_path=raw_log_path)
+        self.queue_size = queue_size
+        self.subscribers = []
+
+        self.buffer = bytearray()
+        self.base = 0
+
+        self.loop = None
+        self.task = None
+        self.running = False
+
+    def subscribe(self, maxsize=None):
+        subscription = Subscription(self, maxsize or self.queue_size)
+        self.subscribers.append(subscription)
+        self.start()
+        return subscription
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.loop = asyncio.get_running_loop()
+        port = self.reader.reader
+        try:
+            port.timeout = 0
+            self.loop.add_reader(port.fileno(), self.__on_readable)
+        except (NotImplementedError, AttributeError):
+            port.timeout = 0.1
+            self.task = self.loop.create_task(self.__read_in_executor())
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        if self.task is None:
+            self.loop.remove_reader(self.reader.reader.fileno())
+        else:
+            self.task.cancel()
+        self.reader.close()
+        for subscription in self.subscribers:
+            subscription.put(None)
+
+    def __on_readable(self):
+        data = self.reader.read_data(self.reader.reader.in_waiting or 1)
+        if data:
+            self.feed(data)
+
+    def __read_blocking(self):
+        return self.reader.read_data(self.reader.reader.in_waiting or 1)
+
+    async def __read_in_executor(self):
+        while self.running:
+            data = await self.loop.run_in_executor(None, self.__read_blocking)
+            if data:
+                self.feed(data)
+
+    def feed(self, data):
+        """Decode ``data`` appended to the pending tail and publish complete frames."""
+        self.buffer += data
+        frames = self.reader.scan_buffer(self.buffer, 0, len(self.buffer), base=self.base, read_time=time.time())
+        while True:
+            try:
+                frame = next(frames)
+            except StopIteration as stop:
+                pos = stop.value
+                break
+            for subscription in self.subscribers:
+                subscription.put(frame)
+
+        del self.buffer[:pos]
+        self.base += pos
+
+    def __aiter__(self):
+        return self.subscribe().__aiter__()
@@ -0,0 +1,170 @@
+import time
+import zlib
+import queue
+import struct
+import threading
+
+
+CAPTURE_MAGIC = b'CRSFCAP1'
+CAPTURE_VERSION = 1
+
+# magic, version, wall clock (ns) and monotonic clock (ns) at capture start
+CAPTURE_HEADER = struct.Struct('<8sBQQ')
+# raw size, stored size, flags
+CHUNK_HEADER = struct.Struct('<IIB')
+# monotonic timestamp (ns), data size
+BLOCK_HEADER = struct.Struct('<QI')
+
+CHUNK_COMPRESSED = 0x01
+
+CHUNK_SIZE = 64 * 1024
+FLUSH_INTERVAL = 1.0  # seconds
+
+
+def is_capture(path):
+    with open(path, 'rb') as source:
+        return source.read(len(CAPTURE_MAGIC)) == CAPTURE_MAGIC
+
+
+class CaptureWriter(object):
+    """
+    Timestamped raw log.
+
+    File is a header followed by chunks, every chunk holds blocks of bytes
+    as they were read, prefixed by their monotonic timestamp. Chunks can be
+    zlib compressed. Writing happens in a background thread, ``write``
+    only stamps and queues the data.
+    """
+
+    def __init__(self, path, compress=False, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.compress = compress
+        self.chunk_size = chunk_size
+
+        self.file = open(path, 'wb')
+        self.file.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, time.time_ns(), time.monotonic_ns()))
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.__run, name="capture-writer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def write(self, data, timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic_ns()
+        self.queue.put((timestamp, bytes(data)))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+
+    def __run(self):
+        chunk = bytearray()
+        deadline = None
+        while True:
+            try:
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+
+            if item:
+                timestamp, data = item
+                chunk += BLOCK_HEADER.pack(timestamp, len(data))
+                chunk += data
+                if deadline is None:
+                    deadline = time.monotonic() + FLUSH_INTERVAL
+
+            if chunk and (not item or len(chunk) >= self.chunk_size):
+                self.__write_chunk(chunk)
+                del chunk[:]
+                deadline = None
+
+            if item is None:
+                break
+
+    def __write_chunk(self, chunk):
+        if self.compress:
+            data = zlib.compress(bytes(chunk))
+            self.file.write(CHUNK_HEADER.pack(len(chunk), len(data), CHUNK_COMPRESSED))
+            self.file.write(data)
+        else:
+            self.file.write(CHUNK_HEADER.pack(len(chunk), len(chunk), 0))
+            self.file.write(chunk)
+        self.file.flush()
+
+
+class CaptureFile(object):
+    """
+    File-like reader of a capture, gives back the original byte stream.
+
+    ``readinto`` never crosses a block boundary, ``timestamp`` is the
+    wall clock time (seconds) of the block the last read came from.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        magic, version, self.start_wall_ns, self.start_monotonic_ns = \
+            CAPTURE_HEADER.unpack(self.file.read(CAPTURE_HEADER.size))
+        if magic != CAPTURE_MAGIC:
+            raise ValueError("Not a capture file: %s" % path)
+        if version != CAPTURE_VERSION:
+            raise ValueError("Unsupported capture version: %s" % version)
+
+        self.chunk = b''
+        self.chunk_pos = 0
+        self.block_end = 0
+        self.pos = 0
+        self.timestamp = None
+        self.timestamp_ns = None
+
+    def to_wall_time(self, timestamp_ns):
+        return (self.start_wall_ns + timestamp_ns - self.start_monotonic_ns) / 1e9
+
+    def __next_chunk(self):
+        header = self.file.read(CHUNK_HEADER.size)
+        if len(header) < CHUNK_HEADER.size:
+            return False
+        raw_size, stored_size, flags = CHUNK_HEADER.unpack(header)
+        data = self.file.read(stored_size)
+        if len(data) < stored_size:
+            return False
+        self.chunk = zlib.decompress(data) if flags & CHUNK_COMPRESSED else data
+        self.chunk_pos = 0
+        return True
+
+    def next_block(self):
+        """Move to the next block, returns its (timestamp ns, bytes) or None at the end."""
+        if self.chunk_pos >= len(self.chunk) and not self.__next_chunk():
+            return None
+        self.timestamp_ns, size = BLOCK_HEADER.unpack_from(self.chunk, self.chunk_pos)
+        self.timestamp = self.to_wall_time(self.timestamp_ns)
+        self.pos = self.chunk_pos + BLOCK_HEADER.size
+        self.block_end = self.chunk_pos = self.pos + size
+        return self.timestamp_ns, self.chunk[self.pos:self.block_end]
+
+    def readinto(self, view):
+        while self.pos >= self.block_end:
+            if self.next_block() is None:
+                return 0
+        count = min(len(view), self.block_end - self.pos)
+        view[:count] = self.chunk[self.pos:self.pos + count]
+        self.pos += count
+        return count
+
+    def read(self, length):
+        data = bytearray(length)
+        return bytes(data[:self.readinto(memoryview(data))])
+
+    def blocks(self):
+        """(timestamp ns, bytes) of every remaining block."""
+        while True:
+            block = self.next_block()
+            if block is None:
+                return
+            self.pos = self.block_end
+            yield block
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,61 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+CHANNELS_COUNT = 16
+CHANNEL_BITS = 11
+CHANNEL_MASK = (1 << CHANNEL_BITS) - 1
+PAYLOAD_SIZE = CHANNELS_COUNT * CHANNEL_BITS // 8  # 22 bytes
+
+# RC value range: 172 -> 988us, 992 -> 1500us, 1811 -> 2012us
+TICKS_MID = 992
+
+
+def ticks_to_us(value):
+    return (value - TICKS_MID) * 5 / 8 + 1500
+
+
+def us_to_ticks(value):
+    return int(round((value - 1500) * 8 / 5.0)) + TICKS_MID
+
+
+def pack_channels(channels, target, offset=0):
+    """Pack 16 channel values (ticks) into ``target[offset:offset + 22]``, the inverse of ``unpack_channels``."""
+    value = 0
+    for i, channel in enumerate(channels):
+        value |= (channel & CHANNEL_MASK) << (CHANNEL_BITS * i)
+    target[offset:offset + PAYLOAD_SIZE] = value.to_bytes(PAYLOAD_SIZE, 'little')
+
+
+def unpack_channels(payload):
+    """16 x 11 bit little-endian channels of a single RC_CHANNELS_PACKED payload."""
+    value = int.from_bytes(bytes(payload[:PAYLOAD_SIZE]), 'little')
+    return [(value >> (CHANNEL_BITS * i)) & CHANNEL_MASK for i in range(CHANNELS_COUNT)]
+
+
+def unpack_channels_batch(payloads):
+    """
+    Unpack N RC_CHANNELS_PACKED payloads at once.
+
+    ``payloads`` is a (N, 22) uint8 array (or anything numpy can turn into one),
+    result is a (N, 16) uint16 array of channel values.
+    """
+    if np is None:
+        raise ImportError("numpy is required for batch decoding")
+
+    data = np.asarray(payloads, dtype=np.uint8)
+    if data.ndim != 2 or data.shape[1] < PAYLOAD_SIZE:
+        raise ValueError("Expected (N, %s) array, got %s" % (PAYLOAD_SIZE, data.shape))
+
+    # Two spare zero bytes, so every channel can be read as a 24 bit window
+    padded = np.zeros((data.shape[0], PAYLOAD_SIZE + 2), dtype=np.uint32)
+    padded[:, :PAYLOAD_SIZE] = data[:, :PAYLOAD_SIZE]
+
+    bit_offsets = np.arange(CHANNELS_COUNT) * CHANNEL_BITS
+    index = bit_offsets >> 3
+    shift = (bit_offsets & 7).astype(np.uint32)
+
+    window = padded[:, index] | (padded[:, index + 1] << 8) | (padded[:, index + 2] << 16)
+    return ((window >> shift) & CHANNEL_MASK).astype(np.uint16)
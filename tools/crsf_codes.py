@@ -1,6 +1,31 @@
 from enum import Enum, unique
 
 
+def enum_lookup(enum):
+    """
+    Build int -> member function for an enum with one byte values.
+
+    Backed by a 256 items list, unknown values fall back to the enum itself,
+    so they raise the same ValueError.
+    """
+    table = [None] * 256
+    for member in enum:
+        table[member.value] = member
+
+    def lookup(value):
+        return table[value] or enum(value)
+
+    return lookup
+
+
+def lookup_or_value(lookup, value):
+    """Enum member for ``value``, the value itself if it is unknown."""
+    try:
+        return lookup(value)
+    except ValueError:
+        return value
+
+
 @unique
 class CrsfFrameAddress(Enum):
     # NEW addresses
@@ -125,6 +150,10 @@ class CrsfFrameType(Enum):
     DISPLAYPORT_CMD = 0x7D  # displayport control command
 
 
+lookup_frame_address = enum_lookup(CrsfFrameAddress)
+lookup_frame_type = enum_lookup(CrsfFrameType)
+
+
 @unique
 class CrsfCommandID(Enum):
     FC = 0x01
@@ -0,0 +1,110 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+CRC_POLY = 0xD5  # CRC-8 DVB-S2, frame type + payload
+CRC_POLY_CMD = 0xBA  # COMMAND frames inner CRC
+COMMAND_TYPE = 0x32
+
+
+def make_crc_table(poly):
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ poly) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+        table.append(crc)
+    return tuple(table)
+
+
+CRC_TABLE = make_crc_table(CRC_POLY)
+CRC_TABLE_CMD = make_crc_table(CRC_POLY_CMD)
+
+if np is not None:
+    # CRC is linear: CRC of a message is the XOR of CRCs of its bytes, each followed by
+    # as many zero bytes as there are after it. Row k holds CRCs of a byte followed by k zeros.
+    CRC_SHIFTED = np.zeros((256, 256), dtype=np.uint8)
+    CRC_SHIFTED[0] = CRC_TABLE
+    for k in range(1, 256):
+        CRC_SHIFTED[k] = CRC_SHIFTED[0][CRC_SHIFTED[k - 1]]
+    CRC_SHIFTED = CRC_SHIFTED.ravel()
+
+# Fewer spans are verified in Python, numpy call overhead would cost more than it saves
+BATCH_MIN = 64
+
+CRC_TABLES = {
+    'frame': CRC_TABLE,
+    'cmd': CRC_TABLE_CMD,
+}
+
+
+def crc8(data, table=CRC_TABLE, crc=0):
+    """CRC-8 of bytes/bytearray/memoryview (or any iterable of ints), ``crc`` continues a previous result."""
+    for byte in data:
+        crc = table[crc ^ byte]
+    return crc
+
+
+def calc_crc(data, crc_type='frame'):
+    return crc8(data, CRC_TABLES[crc_type])
+
+
+def command_crc(payload):
+    """Inner CRC of a COMMAND frame: frame type byte followed by the payload (without the CRC itself)."""
+    return crc8(payload, CRC_TABLE_CMD, CRC_TABLE_CMD[COMMAND_TYPE])
+
+
+def verify_crc_batch(data, spans):
+    """
+    Verify CRC for many frames laid out in one buffer.
+
+    ``spans`` is a sequence of (start, end) offsets of whole frames
+    (sync byte ... crc byte, at most 257 bytes) in ``data``. Returns a list of bools.
+
+    With numpy the CRC of every frame is the XOR of per byte table values,
+    computed for all bytes of all frames at once and reduced per frame.
+    """
+    if np is None or len(spans) < BATCH_MIN:
+        table = CRC_TABLE
+        view = memoryview(data)
+        result = []
+        for start, end in spans:
+            crc = 0
+            for byte in view[start + 2:end - 1]:
+                crc = table[crc ^ byte]
+            result.append(crc == view[end - 1])
+        return result
+
+    array = np.frombuffer(data, dtype=np.uint8)
+    spans = np.asarray(spans, dtype=np.int64)
+    first = spans[:, 0] + 2
+    lengths = spans[:, 1] - 1 - first
+    heads = np.cumsum(lengths) - lengths  # where every frame starts in the joined bytes
+
+    # Offset of every covered byte and the number of bytes after it in its frame
+    offsets = np.arange(int(lengths.sum())) + np.repeat(first - heads, lengths)
+    after = np.repeat(first + lengths - 1, lengths) - offsets
+    crc = np.bitwise_xor.reduceat(CRC_SHIFTED[after * 256 + array[offsets]], heads)
+    return (crc == array[spans[:, 1] - 1]).tolist()
+
+
+class CrsfCrc(object):
+    __slots__ = ('crc', 'calculated_crc')
+
+    def __init__(self, crc, data=None, calculated_crc=None):
+        self.crc = crc
+        # Known when the frame was already verified, e.g. by verify_crc_batch
+        self.calculated_crc = crc8(data) if calculated_crc is None else calculated_crc
+
+    def verify(self):
+        return self.crc == self.calculated_crc
+
+    def __str__(self):
+        if self.verify():
+            return "0x%02X (ok)" % self.crc
+        return "0x%02X (calculated 0x%02X)" % (self.crc, self.calculated_crc)
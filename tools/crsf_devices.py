@@ -0,0 +1,112 @@
+import time
+
+from crsf_codes import CrsfFrameType, lookup_frame_address, lookup_frame_type, lookup_or_value
+
+
+DEVICE_INFO = CrsfFrameType.DEVICE_INFO.value
+EXTENDED_TYPES = 0x28  # frame types from here on start with dst and src address
+
+
+class Device(object):
+    """
+    Device seen on the bus, DEVICE_INFO fields are None until it answered a ping.
+
+    ``address`` None is the bucket of frames without a source address (not extended frames).
+    """
+    __slots__ = ('address', 'name', 'serial_number', 'hardware_id', 'hardware', 'firmware_id',
+                 'parameter_count', 'info_version', 'frames', 'bytes', 'types', 'first_seen', 'last_seen')
+
+    def __init__(self, address):
+        self.address = None if address is None else lookup_or_value(lookup_frame_address, address)
+        self.name = None
+        self.serial_number = None
+        self.hardware_id = None
+        self.hardware = None
+        self.firmware_id = None
+        self.parameter_count = None
+        self.info_version = None
+        self.frames = 0
+        self.bytes = 0
+        self.types = [0] * 256
+        self.first_seen = None
+        self.last_seen = None
+
+    def update_info(self, payload):
+        """Fields of a DEVICE_INFO payload, as decoded by the ``crsf_schema`` decoder."""
+        if payload.failed:
+            return
+        self.name = payload.get("name")
+        self.serial_number = payload.get("serial number")
+        self.hardware_id = int(payload.get("hardware id"), 16)
+        self.hardware = payload.get("hardware id (decoded)")
+        self.firmware_id = payload.get("firmware id")
+        self.parameter_count = payload.get("parameter count")
+        self.info_version = payload.get("device info version")
+
+    def type_counts(self):
+        """{frame type: frames} of the types sent by the device."""
+        return dict((lookup_or_value(lookup_frame_type, i), count) for i, count in enumerate(self.types) if count)
+
+    def __str__(self):
+        if self.address is None:
+            return "unaddressed"
+        label = str(getattr(self.address, 'name', self.address))
+        if self.name is not None:
+            label += " (%s, %s)" % (self.name, getattr(self.hardware, 'name', hex(self.hardware_id)))
+        return label
+
+
+class DeviceRegistry(object):
+    """
+    Devices seen on the bus, by address.
+
+    Extended frames are counted for their source address. Other frames do not say who sent them
+    (the first byte is the sync byte), they go to the ``unaddressed`` device.
+    DEVICE_INFO updates the device fields and every frame gets its ``device`` set, so later
+    consumers use the registry instead of decoding DEVICE_INFO again. Devices are kept
+    in a 256 items list, lookups are plain indexing.
+    """
+
+    def __init__(self):
+        self.devices = [None] * 256
+        self.unaddressed = Device(None)
+
+    def get(self, address):
+        """Device of an address (CrsfFrameAddress or byte), None if not seen."""
+        return self.devices[getattr(address, 'value', address)]
+
+    def device(self, address):
+        device = self.devices[address]
+        if device is None:
+            device = self.devices[address] = Device(address)
+        return device
+
+    def add_frame(self, frame):
+        """Count the frame for its sender and set ``frame.device``, returns the device."""
+        frame_type = getattr(frame.frame_type, 'value', frame.frame_type)
+        payload = frame.payload.payload_raw
+        if frame_type >= EXTENDED_TYPES and len(payload) >= 2:
+            device = self.device(payload[1])
+            if frame_type == DEVICE_INFO:
+                device.update_info(frame.payload)
+        else:
+            device = self.unaddressed
+
+        now = frame.timestamp if frame.timestamp is not None else time.time()
+        if device.first_seen is None:
+            device.first_seen = now
+        device.last_seen = now
+        device.frames += 1
+        device.bytes += len(frame.raw)
+        device.types[frame_type] += 1
+
+        frame.device = device
+        return device
+
+    def __iter__(self):
+        """Devices by address, then the unaddressed frames if there were any."""
+        for device in self.devices:
+            if device is not None:
+                yield device
+        if self.unaddressed.frames:
+            yield self.unaddressed
@@ -0,0 +1,183 @@
+import gc
+import time
+
+from crsf_crc import crc8, command_crc
+from crsf_codes import CrsfFrameType, CrsfFrameAddress
+from crsf_channels import pack_channels, PAYLOAD_SIZE as CHANNELS_SIZE
+
+
+SYNC_BYTE = 0xC8
+MAX_FRAME_SIZE = 64  # address, size, type, up to 60 bytes of payload, CRC
+MAX_PAYLOAD_SIZE = MAX_FRAME_SIZE - 4
+
+RC_CHANNELS_PACKED = CrsfFrameType.RC_CHANNELS_PACKED.value
+DEVICE_PING = CrsfFrameType.DEVICE_PING.value
+PARAMETER_READ = CrsfFrameType.PARAMETER_READ.value
+PARAMETER_WRITE = CrsfFrameType.PARAMETER_WRITE.value
+COMMAND = CrsfFrameType.COMMAND.value
+MSP_REQ = CrsfFrameType.MSP_REQ.value
+MSP_WRITE = CrsfFrameType.MSP_WRITE.value
+
+# MSP data bytes per chunk, after dst, src and status byte
+MSP_CHUNK_SIZE = {
+    MSP_REQ: 57,
+    MSP_WRITE: 7,  # 8 bytes with status, OpenTX outbound telemetry buffer limit
+}
+MSP_START = 0x10
+MSP_VERSION_1 = 0x20
+
+
+def value(item):
+    return getattr(item, 'value', item)
+
+
+class FrameEncoder(object):
+    """
+    Frame builder working in one preallocated buffer.
+
+    Every method returns a memoryview of the frame in the buffer, it is valid until the next call,
+    so write it out (or copy it) first. ``address`` is the first frame byte, ``origin`` the source
+    address of extended frames.
+    """
+
+    def __init__(self, address=SYNC_BYTE, origin=CrsfFrameAddress.RADIO_TRANSMITTER.value):
+        self.buffer = bytearray(MAX_FRAME_SIZE)
+        self.view = memoryview(self.buffer)
+        self.address = value(address)
+        self.origin = value(origin)
+        self.msp_seq = 0
+
+    def finish(self, frame_type, size):
+        """Header and CRC around ``size`` payload bytes already in the buffer."""
+        buf = self.buffer
+        end = 3 + size
+        buf[0] = self.address
+        buf[1] = size + 2
+        buf[2] = frame_type
+        buf[end] = crc8(self.view[2:end])
+        return self.view[:end + 1]
+
+    def extended(self, frame_type, dst, data=b'', prefix=()):
+        """Frame with dst and src addresses, ``prefix`` bytes and ``data``."""
+        start = 5 + len(prefix)
+        size = start - 3 + len(data)
+        if size > MAX_PAYLOAD_SIZE:
+            raise ValueError("Payload too long: %s bytes" % size)
+        buf = self.buffer
+        buf[3] = value(dst)
+        buf[4] = self.origin
+        for index, byte in enumerate(prefix):
+            buf[5 + index] = byte
+        buf[start:start + len(data)] = data
+        return self.finish(frame_type, size)
+
+    def rc_channels(self, channels):
+        """RC_CHANNELS_PACKED from 16 channel values in ticks (see ``crsf_channels.us_to_ticks``)."""
+        pack_channels(channels, self.buffer, 3)
+        return self.finish(RC_CHANNELS_PACKED, CHANNELS_SIZE)
+
+    def device_ping(self, dst=CrsfFrameAddress.BROADCAST):
+        return self.extended(DEVICE_PING, dst)
+
+    def parameter_read(self, dst, number, chunk=0):
+        return self.extended(PARAMETER_READ, dst, prefix=(number, chunk))
+
+    def parameter_write(self, dst, number, data):
+        return self.extended(PARAMETER_WRITE, dst, data, (number,))
+
+    def command(self, dst, command_id, data=b''):
+        """COMMAND frame, ``data`` goes after the command id, inner command CRC is added."""
+        self.extended(COMMAND, dst, data, (value(command_id),))
+        size = self.buffer[1] - 2
+        if size + 1 > MAX_PAYLOAD_SIZE:
+            raise ValueError("Payload too long: %s bytes" % (size + 1))
+        # Command CRC covers the frame type and the payload before it
+        self.buffer[3 + size] = command_crc(self.view[3:3 + size])
+        return self.finish(COMMAND, size + 1)
+
+    def msp(self, frame_type, dst, code, data=b''):
+        """
+        MSP_REQ/MSP_WRITE chunks of an MSP v1 message, one frame per iteration.
+
+        The buffer is reused for every chunk, write each one before taking the next.
+        """
+        frame_type = value(frame_type)
+        chunk_size = MSP_CHUNK_SIZE[frame_type]
+        message = bytes((len(data), value(code))) + bytes(data)
+        checksum = 0
+        for byte in message:
+            checksum ^= byte
+        message += bytes((checksum,))
+
+        buf = self.buffer
+        for index, start in enumerate(range(0, len(message), chunk_size)):
+            chunk = message[start:start + chunk_size]
+            status = self.msp_seq | MSP_VERSION_1
+            if index == 0:
+                status |= MSP_START
+            self.msp_seq = (self.msp_seq + 1) & 0x0F
+            buf[3] = value(dst)
+            buf[4] = self.origin
+            buf[5] = status
+            buf[6:6 + len(chunk)] = chunk
+            yield self.finish(frame_type, 3 + len(chunk))
+
+
+class Transmitter(object):
+    """
+    Sends frames at a fixed rate.
+
+    Send times are scheduled against the start, so sleep errors do not accumulate. The last
+    ``spin`` seconds before a deadline are busy-waited, garbage collection is off while running.
+    A slot missed by more than a whole period is skipped instead of sending a burst.
+    """
+
+    def __init__(self, port, rate, spin=0.0005):
+        self.port = port
+        self.period = 1.0 / rate
+        self.spin = spin
+        self.frames_sent = 0
+        self.frames_missed = 0
+        self.max_late = 0.0
+
+    def run(self, produce, duration=None, count=None):
+        """
+        Call ``produce(slot)`` every period and write the frame it returns (None - nothing to send).
+
+        Runs until ``duration`` seconds or ``count`` slots passed, forever if neither is given.
+        """
+        period = self.period
+        spin = self.spin
+        write = self.port.write
+        clock = time.perf_counter
+
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = clock()
+            slot = 0
+            while (count is None or slot < count) and (duration is None or slot * period < duration):
+                deadline = start + slot * period
+                delay = deadline - clock()
+                if delay > spin:
+                    time.sleep(delay - spin)
+                while clock() < deadline:
+                    pass
+
+                late = clock() - deadline
+                if late > period:
+                    missed = int(late / period)
+                    self.frames_missed += missed
+                    slot += missed
+                    continue
+                if late > self.max_late:
+                    self.max_late = late
+
+                frame = produce(slot)
+                if frame is not None:
+                    write(frame)
+                    self.frames_sent += 1
+                slot += 1
+        finally:
+            if gc_enabled:
+                gc.enable()
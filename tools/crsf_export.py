@@ -0,0 +1,197 @@
+import os
+from enum import Enum
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+
+EXPORT_FORMATS = ['parquet', 'arrow', 'npz']
+BATCH_SIZE = 65536
+
+
+def column_name(field_name):
+    return field_name.lower().replace("(", "").replace(")", "").strip().replace(" ", "_")
+
+
+def column_value(value):
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    return value
+
+
+def text_values(values):
+    """Values as strings, None kept."""
+    return [i if i is None or isinstance(i, str) else str(i) for i in values]
+
+
+def npz_array(values):
+    """
+    Column as a numpy array: numbers (missing values are NaN), strings or,
+    for lists of different lengths, an object array (``np.load(..., allow_pickle=True)``).
+    """
+    if any(isinstance(i, (list, tuple, bytes)) for i in values):
+        try:
+            array = np.asarray(values)
+            if array.dtype != object:
+                return array
+        except ValueError:
+            pass
+        array = np.empty(len(values), dtype=object)
+        for index, value in enumerate(values):
+            array[index] = value
+        return array
+    array = np.asarray(values)
+    if array.dtype == object:
+        if all(i is None or isinstance(i, (int, float)) for i in values):
+            return np.asarray(values, dtype=float)
+        return np.asarray([str(i) for i in values])
+    return array
+
+
+class ColumnarExporter(object):
+    """
+    Collect decoded frames into per frame type columns and write them in batches.
+
+    Every frame type goes to its own file in ``path`` directory:
+    ``<TYPE>.parquet`` / ``<TYPE>.arrow`` (one row group/record batch per flush)
+    or ``<TYPE>_<part>.npz`` (one file per flush).
+    """
+
+    def __init__(self, path, export_format='parquet', batch_size=BATCH_SIZE):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError("Unknown export format: %s" % export_format)
+        if export_format == 'npz' and np is None:
+            raise ImportError("numpy is required for npz export")
+        if export_format in ['parquet', 'arrow'] and pa is None:
+            raise ImportError("pyarrow is required for %s export" % export_format)
+
+        self.path = path
+        self.export_format = export_format
+        self.batch_size = batch_size
+
+        self.columns = {}  # frame type name -> {column name: [values]}
+        self.rows = {}
+        self.writers = {}
+        self.schemas = {}
+        self.parts = {}
+        self.frames_skipped = 0
+        self.values_dropped = 0  # values of a type other than the one their column was written with
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def add(self, frame):
+        if frame.payload.failed:
+            # No fields to export, only the decode error
+            self.frames_skipped += 1
+            return
+        name = frame.frame_type.name
+        fields = [(column_name(i[0]), column_value(i[1])) for i in frame.payload.fields]
+
+        columns = self.columns.get(name)
+        if columns is None:
+            columns = {'timestamp': [], 'offset': [], 'address': []}
+            self.columns[name] = columns
+            self.rows[name] = 0
+        rows = self.rows[name]
+        schema = self.schemas.get(name)
+        for field_name, _ in fields:
+            if field_name not in columns and (schema is None or field_name in schema.names):
+                # New field, earlier rows of the batch do not have it
+                columns[field_name] = [None] * rows
+
+        columns['timestamp'].append(frame.timestamp if frame.timestamp is not None else float('nan'))
+        columns['offset'].append(frame.offset)
+        columns['address'].append(column_value(frame.address))
+        for field_name, value in fields:
+            values = columns.get(field_name)
+            if values is not None and len(values) == rows:
+                values.append(value)
+        # Fields this frame does not have
+        for values in columns.values():
+            if len(values) == rows:
+                values.append(None)
+
+        self.rows[name] = rows + 1
+        if self.rows[name] >= self.batch_size:
+            self.flush(name)
+
+    def flush(self, name=None):
+        names = list(self.columns) if name is None else [name]
+        for name in names:
+            if not self.rows.get(name):
+                continue
+            columns = self.columns[name]
+            if self.export_format == 'npz':
+                self.__write_npz(name, columns)
+            else:
+                self.__write_arrow(name, columns)
+            for values in columns.values():
+                del values[:]
+            self.rows[name] = 0
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            for writer in self.writers.values():
+                writer.close()
+            self.writers = {}
+
+    def __write_npz(self, name, columns):
+        part = self.parts.get(name, 0)
+        self.parts[name] = part + 1
+        arrays = dict((column, npz_array(values)) for column, values in columns.items())
+        np.savez(os.path.join(self.path, "%s_%04d.npz" % (name, part)), **arrays)
+
+    def __write_arrow(self, name, columns):
+        writer = self.writers.get(name)
+        if writer is None:
+            # One type per column: a column holding any string (e.g. enum names) is written as strings
+            columns = dict((column, text_values(values) if any(isinstance(i, str) for i in values) else values)
+                           for column, values in columns.items())
+            table = pa.Table.from_pydict(columns)
+            # A column without values in the first batch has no type, make it strings so later values fit
+            schema = pa.schema([pa.field(i.name, pa.string()) if pa.types.is_null(i.type) else i
+                                for i in table.schema])
+            table = table.cast(schema)
+            file_name = os.path.join(self.path, "%s.%s" % (name, self.export_format))
+            if self.export_format == 'parquet':
+                writer = pa.parquet.ParquetWriter(file_name, schema)
+            else:
+                writer = pa.ipc.new_file(file_name, schema)
+            self.writers[name] = writer
+            self.schemas[name] = schema
+        else:
+            schema = self.schemas[name]
+            table = pa.Table.from_arrays([self.__arrow_array(columns[i.name], i.type) for i in schema], schema=schema)
+        writer.write_table(table)
+
+    def __arrow_array(self, values, value_type):
+        """Column values as an array of the type fixed by the first batch, values that do not fit are dropped."""
+        if pa.types.is_string(value_type):
+            values = text_values(values)
+        try:
+            return pa.array(values, type=value_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+        fitting = []
+        for value in values:
+            try:
+                pa.scalar(value, type=value_type)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                self.values_dropped += 1
+                value = None
+            fitting.append(value)
+        return pa.array(fitting, type=value_type)
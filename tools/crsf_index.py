@@ -0,0 +1,177 @@
+import os
+import mmap
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from read_data import Reader, CRC_OK
+from crsf_capture import is_capture
+
+
+INDEX_MAGIC = b'CRSFIDX1'
+INDEX_SUFFIX = '.idx'
+
+# magic, source size, source mtime (ns)
+INDEX_HEADER = struct.Struct('<8sQQ')
+# byte offset, frame length, type byte, crc state, timestamp (NaN if unknown)
+INDEX_RECORD = struct.Struct('<QBBBd')
+
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class IndexWriter(object):
+    """
+    Sidecar index writer for Reader(index=...).
+
+    Records are written to a temporary file, which replaces the index only
+    when the scan reaches the end of the source.
+    """
+
+    def __init__(self, source_path, path=None):
+        self.path = path or index_path(source_path)
+        self.tmp_path = self.path + '.tmp'
+        self.file = open(self.tmp_path, 'wb')
+        self.file.write(INDEX_HEADER.pack(INDEX_MAGIC, *source_stamp(source_path)))
+        self.buffer = bytearray()
+        self.count = 0
+
+    def add(self, offset, length, frame_type, crc_state, timestamp=None):
+        self.buffer += INDEX_RECORD.pack(offset, length, frame_type, crc_state,
+                                         float('nan') if timestamp is None else timestamp)
+        self.count += 1
+        if len(self.buffer) >= WRITE_BUFFER_SIZE:
+            self.file.write(self.buffer)
+            del self.buffer[:]
+
+    def close(self):
+        self.file.write(self.buffer)
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.tmp_path)
+
+
+class FrameIndex(object):
+    """Memory-mapped index file, record N describes frame number N."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.source_size, self.source_mtime = INDEX_HEADER.unpack_from(self.data)
+        if magic != INDEX_MAGIC:
+            self.close()
+            raise ValueError("Not a frame index: %s" % path)
+        self.count = (len(self.data) - INDEX_HEADER.size) // INDEX_RECORD.size
+
+    def matches(self, source_path):
+        return source_stamp(source_path) == (self.source_size, self.source_mtime)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, number):
+        """(offset, length, type byte, crc state, timestamp) of frame ``number``."""
+        if number < 0:
+            number += self.count
+        if not 0 <= number < self.count:
+            raise IndexError(number)
+        return INDEX_RECORD.unpack_from(self.data, INDEX_HEADER.size + number * INDEX_RECORD.size)
+
+    def numbers_by_type(self, frame_type, crc_ok=True):
+        """Frame numbers of given type (CrsfFrameType or type byte)."""
+        frame_type = getattr(frame_type, 'value', frame_type)
+        if np is not None:
+            dtype = np.dtype([('offset', '<u8'), ('length', 'u1'), ('type', 'u1'),
+                              ('crc', 'u1'), ('timestamp', '<f8')])
+            records = np.frombuffer(self.data, dtype=dtype, count=self.count, offset=INDEX_HEADER.size)
+            mask = records['type'] == frame_type
+            if crc_ok:
+                mask &= records['crc'] == CRC_OK
+            return np.nonzero(mask)[0].tolist()
+
+        return [number for number, record in enumerate(INDEX_RECORD.iter_unpack(self.data[INDEX_HEADER.size:]))
+                if record[2] == frame_type and (not crc_ok or record[3] == CRC_OK)]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def build_index(path, index_file=None):
+    """Scan the log without decoding anything and write its index."""
+    writer = IndexWriter(path, index_file)
+    reader = Reader('mmap', path=path, skip_types=range(256), index=writer)
+    for _ in reader.read_frames():
+        pass
+    reader.close()
+    return writer.path
+
+
+class IndexedLog(object):
+    """
+    Random access to frames of a binary log.
+
+    Sidecar index is reused when it matches the log size and mtime, rebuilt otherwise.
+    ``show_types``/``skip_types`` filter frames by the type stored in the index, before reading them.
+    """
+
+    def __init__(self, path, rebuild=False, show_types=None, skip_types=None):
+        if is_capture(path):
+            raise ValueError("Random access is not supported for capture files: %s" % path)
+        self.path = path
+        index_file = index_path(path)
+
+        self.index = None
+        if not rebuild and os.path.exists(index_file):
+            self.index = FrameIndex(index_file)
+            if not self.index.matches(path):
+                self.index.close()
+                self.index = None
+        if self.index is None:
+            self.index = FrameIndex(build_index(path, index_file))
+
+        self.reader = Reader('mmap', path=path, show_types=show_types, skip_types=skip_types)
+
+    def __len__(self):
+        return len(self.index)
+
+    def frame(self, number):
+        """Decoded frame ``number`` or None if it is filtered out, has a wrong CRC or failed to decode."""
+        offset, length, type_byte, _, timestamp = self.index[number]
+        if self.reader.type_filter is not None and not self.reader.type_filter[type_byte]:
+            self.reader.frames_filtered += 1
+            return None
+        frame = self.reader.read_frame(memoryview(self.reader.reader)[offset:offset + length])
+        if not frame:
+            return None
+        frame.offset = offset
+        frame.timestamp = None if timestamp != timestamp else timestamp
+        return frame
+
+    def frames(self, numbers):
+        for number in numbers:
+            frame = self.frame(number)
+            if frame is not None:
+                yield frame
+
+    def frames_by_type(self, frame_type):
+        return self.frames(self.index.numbers_by_type(frame_type))
+
+    def close(self):
+        self.index.close()
+        self.reader.close()
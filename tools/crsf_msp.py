@@ -0,0 +1,178 @@
+import time
+from collections import OrderedDict
+
+from crsf_crc import crc8
+from crsf_codes import CrsfFrameType, lookup_frame_address, lookup_or_value
+from msp_codes import lookup_msp_code
+
+
+MSP_TYPES = (CrsfFrameType.MSP_REQ.value, CrsfFrameType.MSP_RESP.value, CrsfFrameType.MSP_WRITE.value)
+
+# Status byte of every chunk
+STATUS_SEQ = 0x0F
+STATUS_START = 0x10
+STATUS_VERSION = 0x60
+STATUS_ERROR = 0x80
+VERSION_1 = 0x20
+VERSION_2 = 0x40
+
+TIMEOUT = 1.0  # seconds without a chunk before a partial message is dropped
+MAX_PENDING = 64
+
+
+class MspMessage(object):
+    """Reassembled MSP message, ``data`` is the message payload without size, code and checksum."""
+    __slots__ = ('frame_type', 'dst', 'src', 'version', 'code', 'data', 'error', 'chunks', 'timestamp')
+
+    def __init__(self, frame_type, dst, src, version, code, data, error, chunks, timestamp):
+        self.frame_type = frame_type
+        self.dst = dst
+        self.src = src
+        self.version = version
+        self.code = code
+        self.data = data
+        self.error = error
+        self.chunks = chunks
+        self.timestamp = timestamp
+
+    @property
+    def fields(self):
+        return (
+            ("dst address", lookup_or_value(lookup_frame_address, self.dst)),
+            ("src address", lookup_or_value(lookup_frame_address, self.src)),
+            ("MSP version", self.version),
+            ("MSP code", lookup_or_value(lookup_msp_code, self.code) if self.code < 256 else self.code),
+            ("MSP payload length", len(self.data)),
+            ("MSP payload", list(self.data)),
+            ("MSP error", self.error),
+            ("chunks", self.chunks),
+        )
+
+    def __str__(self):
+        return "MSP {}; {}".format(CrsfFrameType(self.frame_type).name,
+                                   "; ".join("%s: %s" % (name, getattr(value, 'name', value))
+                                             for name, value in self.fields))
+
+
+class PartialMessage(object):
+    __slots__ = ('dst', 'src', 'status', 'data', 'length', 'chunks', 'updated')
+
+    def __init__(self, dst, src, status, data, length, updated):
+        self.dst = dst
+        self.src = src
+        self.status = status
+        self.data = data
+        self.length = length
+        self.chunks = 1
+        self.updated = updated
+
+
+def message_length(version, data):
+    """Full message length (header, payload and checksum) from its first bytes, None if not known yet."""
+    if version == VERSION_1:
+        return data[0] + 3 if len(data) >= 1 else None
+    # v2: flags, code (2), size (2), payload, CRC
+    return data[3] + (data[4] << 8) + 6 if len(data) >= 5 else None
+
+
+class MspReassembler(object):
+    """
+    Stitches MSP over CRSF chunks (MSP_REQ/MSP_RESP/MSP_WRITE payloads) into MSP messages.
+
+    Every chunk is dst, src, status byte (sequence, start flag, version, error) and data.
+    Partial messages are kept by (frame type, src, dst, next sequence number), so interleaved
+    messages of different device pairs do not mix. A partial message is dropped when no chunk
+    came for ``timeout`` seconds, or when more than ``max_pending`` messages are incomplete.
+    """
+
+    def __init__(self, timeout=TIMEOUT, max_pending=MAX_PENDING):
+        self.timeout = timeout
+        self.max_pending = max_pending
+        # Ordered by last chunk time, stale messages are always in front
+        self.pending = OrderedDict()
+
+        self.messages_ok = 0
+        self.checksum_errors = 0
+        self.chunks_dropped = 0
+        self.messages_expired = 0
+
+    def add_frame(self, frame):
+        """Feed a decoded frame, other than MSP frames are ignored. Returns a completed MspMessage or None."""
+        frame_type = getattr(frame.frame_type, 'value', frame.frame_type)
+        if frame_type not in MSP_TYPES:
+            return None
+        return self.add(frame_type, frame.payload.payload_raw, frame.timestamp)
+
+    def add(self, frame_type, payload, timestamp=None):
+        """Feed a chunk payload. Returns a completed MspMessage or None."""
+        now = timestamp if timestamp is not None else time.time()
+        self.expire(now)
+
+        if len(payload) < 4:
+            self.chunks_dropped += 1
+            return None
+
+        dst, src, status = payload[0], payload[1], payload[2]
+        seq = status & STATUS_SEQ
+
+        if status & STATUS_START:
+            version = status & STATUS_VERSION
+            if version not in (VERSION_1, VERSION_2):
+                self.chunks_dropped += 1
+                return None
+            partial = PartialMessage(dst, src, status, bytearray(payload[3:]), None, now)
+            partial.length = message_length(version, partial.data)
+        else:
+            partial = self.pending.pop((frame_type, src, dst, seq), None)
+            if partial is None:
+                self.chunks_dropped += 1
+                return None
+            partial.data += payload[3:]
+            partial.chunks += 1
+            partial.updated = now
+            if partial.length is None:
+                partial.length = message_length(partial.status & STATUS_VERSION, partial.data)
+
+        if partial.length is not None and len(partial.data) >= partial.length:
+            return self.complete(frame_type, partial)
+
+        key = (frame_type, src, dst, (seq + 1) & STATUS_SEQ)
+        if self.pending.pop(key, None) is not None:
+            self.messages_expired += 1
+        self.pending[key] = partial
+        if len(self.pending) > self.max_pending:
+            self.pending.popitem(last=False)
+            self.messages_expired += 1
+        return None
+
+    def expire(self, now):
+        pending = self.pending
+        while pending:
+            key = next(iter(pending))
+            if now - pending[key].updated <= self.timeout:
+                break
+            del pending[key]
+            self.messages_expired += 1
+
+    def complete(self, frame_type, partial):
+        data = bytes(partial.data[:partial.length])
+        version = partial.status & STATUS_VERSION
+
+        if version == VERSION_1:
+            checksum = 0
+            for byte in data[:-1]:
+                checksum ^= byte
+            code = data[1]
+            body = data[2:-1]
+        else:
+            checksum = crc8(data[:-1])
+            code = data[1] + (data[2] << 8)
+            body = data[5:-1]
+
+        if checksum != data[-1]:
+            self.checksum_errors += 1
+            return None
+
+        self.messages_ok += 1
+        return MspMessage(frame_type, partial.dst, partial.src, 1 if version == VERSION_1 else 2, code, body,
+                          bool(partial.status & STATUS_ERROR), partial.chunks, partial.updated)
@@ -0,0 +1,140 @@
+import time
+import heapq
+import queue
+import threading
+from collections import OrderedDict
+
+from read_data import Reader, LOG
+
+
+REORDER_WINDOW = 0.05  # seconds frames are held back to be merged in time order
+MATCH_WINDOW = 0.5  # seconds a frame is looked for on other ports
+MAX_PENDING = 4096
+
+COUNTERS = ['bytes_skipped', 'bytes_total', 'frames_bad', 'frames_decoded', 'frames_total',
+            'crc_wrong', 'crc_ok', 'frames_filtered']
+
+
+class MultiPortReader(object):
+    """
+    Reads several serial ports at once, one thread and Reader per port.
+
+    Frames of all ports are stamped with the same monotonic clock when their bytes are read,
+    get ``port`` (index into ``paths``) and are merged into one stream in timestamp order.
+    Frames are held back ``window`` seconds so a late thread does not break the order.
+    Counters are totals over all ports.
+    """
+
+    def __init__(self, paths, baudrate=420000, raw_log_paths=None, window=REORDER_WINDOW, **options):
+        self.paths = paths
+        self.window = window
+        self.readers = []
+        for index, path in enumerate(paths):
+            raw_log_path = raw_log_paths[index] if raw_log_paths else None
+            self.readers.append(Reader('serial', path=path, baudrate=baudrate, raw_log_path=raw_log_path,
+                                       clock=time.monotonic, **options))
+        self.queue = queue.Queue()
+        self.threads = []
+        self.stopped = threading.Event()
+
+    def __getattr__(self, name):
+        if name in COUNTERS:
+            return sum(getattr(reader, name) for reader in self.readers)
+        raise AttributeError(name)
+
+    def __run(self, port, reader):
+        try:
+            for frame in reader.read_frames():
+                frame.port = port
+                self.queue.put((frame.timestamp, port, frame))
+                if self.stopped.is_set():
+                    break
+        except Exception as err:
+            if not self.stopped.is_set():
+                LOG.error("Port %s - %r" % (self.paths[port], err))
+        finally:
+            self.queue.put(None)
+
+    def read_frames(self):
+        for port, reader in enumerate(self.readers):
+            thread = threading.Thread(target=self.__run, args=(port, reader), name="port-%s" % port)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+        heap = []
+        running = len(self.threads)
+        sequence = 0  # keeps equal timestamps in arrival order
+        while running or heap:
+            try:
+                item = self.queue.get(timeout=self.window) if running else None
+                if item is None and running:
+                    running -= 1
+                elif item is not None:
+                    heapq.heappush(heap, (item[0], sequence, item[2]))
+                    sequence += 1
+            except queue.Empty:
+                pass
+
+            limit = time.monotonic() - self.window
+            while heap and (not running or heap[0][0] <= limit):
+                yield heapq.heappop(heap)[2]
+
+    def close(self):
+        self.stopped.set()
+        for reader in self.readers:
+            if hasattr(reader.reader, 'cancel_read'):
+                reader.reader.cancel_read()
+        for thread in self.threads:
+            thread.join(1.0)
+        for reader in self.readers:
+            reader.close()
+
+
+class HopMatcher(object):
+    """
+    Per-hop latency from the same frame seen on several ports.
+
+    Frames are matched by type, payload and CRC (the address byte may change between hops).
+    The latency is taken between the previous and the current sighting, so a chain
+    A -> B -> C gives A -> B and B -> C. Frames repeated on the same port (e.g. idle RC
+    channels) restart the match; unmatched frames are forgotten after ``window`` seconds.
+    """
+
+    def __init__(self, window=MATCH_WINDOW, max_pending=MAX_PENDING):
+        self.window = window
+        self.max_pending = max_pending
+        self.pending = OrderedDict()  # frame key -> (timestamp, port), oldest first
+        self.hops = {}  # (from port, to port) -> [count, total, min, max]
+
+    def add_frame(self, frame):
+        """Returns (from port, to port, latency) when the frame was seen on another port before."""
+        now = frame.timestamp
+        pending = self.pending
+        while pending:
+            key = next(iter(pending))
+            if now - pending[key][0] <= self.window and len(pending) <= self.max_pending:
+                break
+            del pending[key]
+
+        key = bytes(frame.raw[2:])
+        seen = pending.pop(key, None)
+        pending[key] = (now, frame.port)
+        if seen is None or seen[1] == frame.port:
+            return None
+
+        latency = now - seen[0]
+        stats = self.hops.get((seen[1], frame.port))
+        if stats is None:
+            self.hops[(seen[1], frame.port)] = [1, latency, latency, latency]
+        else:
+            stats[0] += 1
+            stats[1] += latency
+            stats[2] = min(stats[2], latency)
+            stats[3] = max(stats[3], latency)
+        return seen[1], frame.port, latency
+
+    def summary(self):
+        """{(from port, to port): {'count', 'mean', 'min', 'max'}}, latencies in seconds."""
+        return dict((hop, {'count': count, 'mean': total / count, 'min': low, 'max': high})
+                    for hop, (count, total, low, high) in self.hops.items())
@@ -0,0 +1,157 @@
+import sys
+import json
+import queue
+import struct
+import threading
+from enum import Enum
+
+
+OUTPUT_FORMATS = ['text', 'extended', 'json', 'binary']
+
+QUEUE_SIZE = 16 * 1024
+BATCH_SIZE = 1024
+
+# timestamp (NaN if unknown), source offset, frame length
+BINARY_RECORD = struct.Struct('<dQB')
+
+
+def frame_lines(frame):
+    """Extended view of a frame, one line per field."""
+    lines = ["==========New frame==========="]
+
+    for field in frame.fields:
+        if hasattr(field[1], 'payload'):
+            lines.append("payload:")
+            for j in getattr(field[1], 'payload'):
+                name = j[0]
+                value = j[1]
+                if isinstance(value, Enum) and hasattr(value, 'name'):
+                    value = getattr(value, 'name')
+                lines.append("  %s: %s" % (name, value))
+        elif hasattr(field[1], 'name'):
+            lines.append("%s: %s" % (field[0], field[1].name))
+        else:
+            lines.append("%s: %s" % (field[0], field[1]))
+
+    return lines
+
+
+def json_value(value):
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return value
+
+
+def frame_record(frame):
+    """Frame as a flat dict, field names as in the decoders."""
+    record = {
+        'timestamp': frame.timestamp,
+        'offset': frame.offset,
+        'address': json_value(frame.address),
+        'type': json_value(frame.frame_type),
+        'size': frame.data_size,
+        'crc': frame.crc.crc,
+    }
+    if frame.device is not None:
+        record['device'] = str(frame.device)
+    for name, value in frame.payload.fields:
+        record[name] = json_value(value)
+    return record
+
+
+def encode_text(frame):
+    return (str(frame) + "\n").encode()
+
+
+def encode_extended(frame):
+    return ("\n".join(frame_lines(frame)) + "\n").encode()
+
+
+def encode_json(frame):
+    return (json.dumps(frame_record(frame), default=str) + "\n").encode()
+
+
+def encode_binary(frame):
+    """Raw frame prefixed by its timestamp, offset and length."""
+    timestamp = float('nan') if frame.timestamp is None else frame.timestamp
+    return BINARY_RECORD.pack(timestamp, frame.offset or 0, len(frame.raw)) + bytes(frame.raw)
+
+
+ENCODERS = {
+    'text': encode_text,
+    'extended': encode_extended,
+    'json': encode_json,
+    'binary': encode_binary,
+}
+
+
+class OutputSink(object):
+    """
+    Frame output written from a background thread.
+
+    ``put`` only queues the frame, so lazy decoding, formatting and writes
+    do not happen on the reading thread. Frames are written in batches.
+    With ``drop`` set, frames are dropped (and counted) while the queue is full
+    instead of blocking the reader.
+    """
+
+    def __init__(self, path='-', output_format='text', drop=False, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE):
+        if path == '-':
+            self.file = sys.stdout.buffer
+            self.close_file = False
+        else:
+            self.file = open(path, 'wb')
+            self.close_file = True
+
+        self.encode = ENCODERS[output_format]
+        self.drop = drop
+        self.batch_size = batch_size
+        self.frames_dropped = 0
+        self.frames_failed = 0
+        self.frames_written = 0
+
+        self.queue = queue.Queue(queue_size)
+        self.thread = threading.Thread(target=self.__run, name="output-sink")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, frame):
+        if not self.drop:
+            self.queue.put(frame)
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.close_file:
+            self.file.close()
+
+    def __run(self):
+        running = True
+        while running:
+            batch = []
+            frame = self.queue.get()
+            while frame is not None:
+                try:
+                    batch.append(self.encode(frame))
+                except Exception:
+                    self.frames_failed += 1
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    frame = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if frame is None:
+                running = False
+
+            if batch:
+                self.file.write(b''.join(batch))
+                self.file.flush()
+                self.frames_written += len(batch)
@@ -0,0 +1,191 @@
+import os
+import sys
+import mmap
+import logging
+import argparse
+import multiprocessing
+from collections import deque
+
+from crsf_crc import crc8
+from read_data import Reader, SYNC, MAX_FRAME_SYZE, LOG
+from crsf_capture import is_capture
+
+
+SHARD_SIZE = 16 * 1024 * 1024
+
+COUNTERS = ('bytes_skipped', 'bytes_total', 'frames_bad', 'frames_decoded',
+            'frames_total', 'crc_wrong', 'crc_ok', 'frames_filtered')
+
+
+def frame_end_at(data, pos):
+    """End offset of a frame with valid length and CRC starting at ``pos``, None otherwise."""
+    if pos + 1 >= len(data) or data[pos] != SYNC[0]:
+        return None
+    size = data[pos + 1]
+    end = pos + size + 2
+    if size < 2 or size > MAX_FRAME_SYZE or end > len(data):
+        return None
+    if crc8(data[pos + 2:end - 1]) != data[end - 1]:
+        return None
+    return end
+
+
+def find_sync_point(data, start):
+    """
+    First offset at or after ``start`` where the stream is in sync.
+
+    Two back to back valid frames (or a valid frame followed by end of data)
+    are required, a lone sync byte with matching CRC inside a payload is too likely.
+    """
+    pos = start
+    while True:
+        pos = data.find(SYNC, pos)
+        if pos < 0:
+            return len(data)
+        end = frame_end_at(data, pos)
+        if end is not None and (end == len(data) or frame_end_at(data, end) is not None):
+            return pos
+        pos += 1
+
+
+def split_shards(path, shard_size=SHARD_SIZE, options=None):
+    """
+    Split file into [start, stop) ranges, every range except the first begins at a sync point.
+
+    ``options`` are Reader keyword arguments passed to every shard.
+    """
+    if is_capture(path):
+        raise ValueError("Capture files can not be split into shards: %s" % path)
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    with open(path, 'rb') as source:
+        data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            points = [0]
+            for start in range(shard_size, size, shard_size):
+                points.append(max(find_sync_point(data, start), points[-1]))
+            points.append(size)
+        finally:
+            data.close()
+
+    return [(path, start, stop, options or {}) for start, stop in zip(points[:-1], points[1:]) if start < stop]
+
+
+def parse_shard(shard):
+    path, start, stop, options = shard
+    reader = Reader('mmap', path=path, **options)
+    frames = []
+    for frame in reader.read_frames(start, stop):
+        # Decode here, in the worker, payloads are decoded lazily otherwise
+        frame.payload.fields
+        frames.append(frame.detach())
+    counters = dict((i, getattr(reader, i)) for i in COUNTERS)
+    reader.close()
+    return counters, frames
+
+
+class ParallelReader(object):
+    """
+    Parse a binary log with a pool of processes.
+
+    File is split into shards aligned to sync points, so every frame belongs
+    to exactly one shard. Shard results are merged in file order. At most ``window``
+    shards (2 per process by default) are parsed or waiting ahead of the consumer,
+    so memory use does not grow with the file size.
+    """
+    bytes_skipped = 0
+    bytes_total = 0
+
+    frames_bad = 0
+    frames_decoded = 0
+    frames_total = 0
+
+    crc_wrong = 0
+    crc_ok = 0
+
+    frames_filtered = 0
+
+    def __init__(self, path, jobs=None, shard_size=SHARD_SIZE, show_types=None, skip_types=None,
+                 filtered_crc=True, window=None):
+        self.reader_path = path
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.window = window or 2 * self.jobs
+        self.shard_size = shard_size
+        self.options = {'show_types': show_types, 'skip_types': skip_types, 'filtered_crc': filtered_crc}
+
+    def read_frames(self):
+        shards = split_shards(self.reader_path, self.shard_size, self.options)
+        if not shards:
+            return
+
+        pool = multiprocessing.Pool(self.jobs)
+        try:
+            shards = iter(shards)
+            pending = deque()
+            for shard in shards:
+                pending.append(pool.apply_async(parse_shard, (shard,)))
+                if len(pending) >= self.window:
+                    break
+            while pending:
+                counters, frames = pending.popleft().get()
+                # Next shard takes the place of the one being consumed
+                for shard in shards:
+                    pending.append(pool.apply_async(parse_shard, (shard,)))
+                    break
+                for name, value in counters.items():
+                    setattr(self, name, getattr(self, name) + value)
+                for frame in frames:
+                    yield frame
+                del frames
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def close(self):
+        pass
+
+
+def compare_counters(path, jobs=None, shard_size=SHARD_SIZE):
+    """
+    Read the file with ParallelReader and with a single mmap Reader, payloads decoded,
+    and return counters that differ as {name: (sequential, parallel)}. ``frames`` compares
+    offsets of the frames read.
+    """
+    results = []
+    for reader in [Reader('mmap', path=path), ParallelReader(path, jobs=jobs, shard_size=shard_size)]:
+        offsets = []
+        for frame in reader.read_frames():
+            frame.payload.fields
+            offsets.append(frame.offset)
+        reader.close()
+        counters = dict((i, getattr(reader, i)) for i in COUNTERS)
+        counters['frames'] = offsets
+        results.append(counters)
+    sequential, parallel = results
+    return dict((i, (sequential[i], parallel[i])) for i in sequential if sequential[i] != parallel[i])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Check that parallel parsing gives the same frames and counters')
+    parser.add_argument("--path", action="store", required=True, help="Binary log")
+    parser.add_argument("--jobs", action="store", type=int, help="Processes, all CPUs by default")
+    parser.add_argument("--shard_size", action="store", type=int, default=SHARD_SIZE,
+                        help="Shard size, small shards put more frames on shard boundaries")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Only counters matter here, not errors of every bad frame
+    LOG.setLevel(logging.CRITICAL)
+    differences = compare_counters(args.path, args.jobs, args.shard_size)
+    for name, (sequential, parallel) in sorted(differences.items()):
+        if name == 'frames':
+            sequential, parallel = "%s frames" % len(sequential), "%s frames" % len(parallel)
+        print("%s: sequential %s, parallel %s" % (name, sequential, parallel))
+    if differences:
+        sys.exit(1)
+    print("Frames and counters match")
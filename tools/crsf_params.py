@@ -0,0 +1,255 @@
+import struct
+
+from crsf_codes import CrsfFrameType, CrsfDataType
+
+
+ENTRY = CrsfFrameType.PARAMETER_SETTINGS_ENTRY.value
+WRITE = CrsfFrameType.PARAMETER_WRITE.value
+READ = CrsfFrameType.PARAMETER_READ.value
+DEVICE_INFO = CrsfFrameType.DEVICE_INFO.value
+
+ROOT_FOLDER = 0
+
+NUMBER_FORMATS = {
+    CrsfDataType.UINT8: struct.Struct('>B'),
+    CrsfDataType.INT8: struct.Struct('>b'),
+    CrsfDataType.UINT16: struct.Struct('>H'),
+    CrsfDataType.INT16: struct.Struct('>h'),
+    CrsfDataType.UINT32: struct.Struct('>I'),
+    CrsfDataType.INT32: struct.Struct('>i'),
+    CrsfDataType.UINT64: struct.Struct('>Q'),
+    CrsfDataType.INT64: struct.Struct('>q'),
+}
+FLOAT_VALUE = struct.Struct('>i')
+
+
+def read_string(data, pos):
+    """Null terminated string at ``pos``, returns it with the position after the terminator."""
+    end = data.index(0, pos)
+    return bytes(data[pos:end]).decode('ascii', 'replace'), end + 1
+
+
+def read_numbers(data, pos, fmt, count):
+    values = [fmt.unpack_from(data, pos + i * fmt.size)[0] for i in range(count)]
+    return values, pos + count * fmt.size
+
+
+class Parameter(object):
+    """
+    Decoded parameter entry.
+
+    ``info`` holds the data type specific fields: min, max, default, units,
+    options (text selection), precision and step (float), status and timeout (command).
+    """
+    __slots__ = ('number', 'parent', 'data_type', 'hidden', 'name', 'value', 'info', 'stale')
+
+    def __init__(self, number, parent, data_type, hidden, name, value=None, info=None):
+        self.number = number
+        self.parent = parent
+        self.data_type = data_type
+        self.hidden = hidden
+        self.name = name
+        self.value = value
+        self.info = info or {}
+        self.stale = False
+
+    @property
+    def fields(self):
+        return (
+            ("parameter number", self.number),
+            ("parent folder", self.parent),
+            ("hidden", self.hidden),
+            ("data type", self.data_type),
+            ("name", self.name),
+            ("value", self.value),
+        ) + tuple(sorted(self.info.items()))
+
+    def __str__(self):
+        return "; ".join("%s: %s" % (name, getattr(value, 'name', value)) for name, value in self.fields)
+
+
+def decode_parameter(number, data):
+    """
+    Parameter from the joined data of all entry chunks (parent folder, type, name, type specific data).
+
+    Numbers are value, min, max, default and units, floats are scaled by their decimal point.
+    Data that can not be decoded is kept in ``info['raw']``.
+    """
+    parameter = Parameter(number, None, None, False, None)
+    info = parameter.info
+    pos = 0
+
+    try:
+        parameter.parent = data[0]
+        parameter.hidden = bool(data[1] & 0x80)
+        try:
+            data_type = CrsfDataType(data[1] & 0x7F)
+        except ValueError:
+            data_type = data[1] & 0x7F
+        parameter.data_type = data_type
+        parameter.name, pos = read_string(data, 2)
+
+        if data_type in NUMBER_FORMATS:
+            values, pos = read_numbers(data, pos, NUMBER_FORMATS[data_type], 4)
+            parameter.value = values[0]
+            info['min'], info['max'], info['default'] = values[1:]
+            info['units'], pos = read_string(data, pos)
+        elif data_type == CrsfDataType.FLOAT:
+            values, pos = read_numbers(data, pos, FLOAT_VALUE, 4)
+            precision = data[pos]
+            step = FLOAT_VALUE.unpack_from(data, pos + 1)[0]
+            scale = 10.0 ** precision
+            parameter.value = values[0] / scale
+            info['min'], info['max'], info['default'] = [i / scale for i in values[1:]]
+            info['precision'] = precision
+            info['step'] = step / scale
+            info['units'], pos = read_string(data, pos + 5)
+        elif data_type == CrsfDataType.TEXT_SELECTION:
+            options, pos = read_string(data, pos)
+            info['options'] = options.split(';')
+            parameter.value, info['min'], info['max'], info['default'] = data[pos:pos + 4]
+            info['units'], pos = read_string(data, pos + 4)
+        elif data_type in (CrsfDataType.STRING, CrsfDataType.INFO):
+            parameter.value, pos = read_string(data, pos)
+            if data_type == CrsfDataType.STRING and pos < len(data):
+                info['max length'] = data[pos]
+        elif data_type == CrsfDataType.COMMAND:
+            info['status'], info['timeout'] = data[pos], data[pos + 1] * 10  # ms
+            parameter.value, pos = read_string(data, pos + 2)
+        elif data_type != CrsfDataType.FOLDER:
+            info['raw'] = list(data[pos:])
+    except (IndexError, ValueError, struct.error):
+        info['raw'] = list(data[pos:])
+    return parameter
+
+
+class DeviceParameters(object):
+    """Parameters of one device, by number."""
+
+    def __init__(self, address):
+        self.address = address
+        self.parameter_count = None
+        self.parameters = {}
+        # number -> (joined data, chunks received, chunks remaining in the last one)
+        self.pending = {}
+        # number -> chunk number of the last PARAMETER_READ
+        self.requested = {}
+        self.chunks_dropped = 0
+
+    def add_read(self, number, chunk):
+        """PARAMETER_READ sent to the device, tells which chunk the next entry is."""
+        self.requested[number] = chunk
+
+    def add_chunk(self, number, remaining, data):
+        """
+        Add an entry chunk, returns the Parameter when it was the last one.
+
+        A chunk that does not continue the pending data is taken as a first chunk,
+        unless the read it answers asked for a later chunk (e.g. a capture starting
+        in the middle of a transfer), then it is dropped.
+        """
+        requested = self.requested.pop(number, None)
+        pending = self.pending.get(number)
+        if pending is not None and remaining == pending[2] - 1:
+            pending[0].extend(data)
+            pending[1] += 1
+            pending[2] = remaining
+        elif requested:
+            # Continuation without its first chunk
+            self.pending.pop(number, None)
+            self.chunks_dropped += 1
+            return None
+        else:
+            # First chunk, or chunks of an older read were lost
+            pending = self.pending[number] = [bytearray(data), 1, remaining]
+
+        if remaining:
+            return None
+        del self.pending[number]
+        parameter = decode_parameter(number, pending[0])
+        self.parameters[number] = parameter
+        return parameter
+
+    def invalidate(self, number):
+        parameter = self.parameters.get(number)
+        if parameter is not None:
+            parameter.stale = True
+
+    def to_read(self):
+        """
+        (parameter number, chunk number) of the next reads: missing and stale entries only.
+
+        Unfinished entries continue from the next chunk.
+        """
+        numbers = set(number for number, parameter in self.parameters.items() if parameter.stale)
+        if self.parameter_count is not None:
+            numbers.update(i for i in range(1, self.parameter_count + 1) if i not in self.parameters)
+        numbers.update(self.pending)
+        return [(number, self.pending[number][1] if number in self.pending else 0) for number in sorted(numbers)]
+
+    def children(self, folder=ROOT_FOLDER):
+        return [self.parameters[i] for i in sorted(self.parameters)
+                if self.parameters[i].parent == folder and i != folder]
+
+    def walk(self, folder=ROOT_FOLDER, depth=0):
+        """(depth, parameter) of the folder tree, depth first."""
+        for parameter in self.children(folder):
+            yield depth, parameter
+            if parameter.data_type == CrsfDataType.FOLDER:
+                for item in self.walk(parameter.number, depth + 1):
+                    yield item
+
+
+class ParameterCache(object):
+    """
+    Parameter menus of all devices on the link, built from the frames seen.
+
+    PARAMETER_SETTINGS_ENTRY chunks are joined and decoded per device (source address),
+    PARAMETER_READ tells which chunk the next entry is, PARAMETER_WRITE marks the written parameter stale and DEVICE_INFO gives the parameter count,
+    so ``to_read`` lists only entries that have to be fetched again.
+    """
+
+    def __init__(self):
+        self.devices = {}
+
+    def device(self, address):
+        device = self.devices.get(address)
+        if device is None:
+            device = self.devices[address] = DeviceParameters(address)
+        return device
+
+    def add_frame(self, frame):
+        """Feed a frame, returns the Parameter completed by it or None."""
+        frame_type = getattr(frame.frame_type, 'value', frame.frame_type)
+        if frame_type not in (ENTRY, WRITE, READ, DEVICE_INFO):
+            return None
+        payload = frame.payload.payload_raw
+        if len(payload) < 3:
+            return None
+        if frame_type == READ:
+            if len(payload) >= 4:
+                self.device(payload[0]).add_read(payload[2], payload[3])
+            return None
+        if frame_type == ENTRY:
+            if len(payload) < 5:
+                return None
+            return self.device(payload[1]).add_chunk(payload[2], payload[3], payload[4:])
+        if frame_type == WRITE:
+            self.device(payload[0]).invalidate(payload[2])
+        else:
+            # Parameter count is the second to last byte, a change means the menu changed
+            device = self.device(payload[1])
+            if device.parameter_count is not None and device.parameter_count != payload[-2]:
+                for parameter in device.parameters.values():
+                    parameter.stale = True
+            device.parameter_count = payload[-2]
+        return None
+
+    def to_read(self):
+        """{device address: [(parameter number, chunk number), ...]} of entries to fetch."""
+        result = {}
+        for address, device in self.devices.items():
+            reads = device.to_read()
+            if reads:
+                result[address] = reads
+        return result
@@ -0,0 +1,265 @@
+import struct
+
+from crsf_codes import CrsfFrameType, CrsfVtxInterface, CrsfVtxPitmode, CrsfVtxXPower, CrsfHardwareID,\
+    lookup_frame_address
+
+
+class Bits(object):
+    """Bit field of the raw value: ``(value >> shift) & (2 ** width - 1)``."""
+
+    def __init__(self, shift, width):
+        self.shift = shift
+        self.mask = (1 << width) - 1
+
+
+# Formats of a fixed size field, all big-endian, 'u24' is an unsigned 24 bit integer
+FIXED_FORMATS = set('bBhHiIqQx') | {'u24'}
+# Formats of the single variable size field: ascii text, list of bytes
+VARIABLE_FORMATS = {'text', 'list'}
+
+
+def split_fields(fields):
+    """Fields before the variable size field, the variable size field (or None) and fields after it."""
+    head, tail, variable = [], [], None
+    for field in fields:
+        if field[1] in VARIABLE_FORMATS:
+            if variable is not None:
+                raise ValueError("Only one variable size field is supported")
+            variable = field
+        elif field[1] is not None and field[1] not in FIXED_FORMATS:
+            raise ValueError("Unknown format %r of %s" % (field[1], field[0]))
+        elif variable is None:
+            head.append(field)
+        else:
+            tail.append(field)
+    return head, variable, tail
+
+
+def convert(field, expression, namespace):
+    """Expression with the field converters applied, converter functions are put into ``namespace``."""
+    for converter in field[2:]:
+        if isinstance(converter, Bits):
+            expression = "(%s >> %d & %d)" % (expression, converter.shift, converter.mask)
+        elif isinstance(converter, (int, float)):
+            expression = "%s / %r" % (expression, float(converter))
+        else:
+            key = "c%d" % len(namespace)
+            namespace[key] = converter
+            expression = "%s(%s)" % (key, expression)
+    return expression
+
+
+def variable_expression(field, middle):
+    if field[1] == 'text':
+        return "bytes(%s).decode('ascii', 'replace')" % middle
+    return "list(bytes(%s))" % middle
+
+
+def compile_schema(fields, name='decode'):
+    """
+    Build a decode function from a payload layout.
+
+    Every field is ``(name, format, converters...)``. Format is a big-endian struct code, ``u24``,
+    ``x`` (skipped byte, name is None) or None, which reuses the raw value of the previous field,
+    e.g. for bit fields of the same byte. One field can be variable size (``text`` or ``list``):
+    fields before it are read from the payload start, fields after it from the payload end.
+    Converters are applied in order: Bits, number (value is divided by it) or function.
+
+    Fields are read with one ``struct.Struct.unpack_from`` per side (plain indexing if a side
+    has single bytes only), the function returns a tuple of (name, value) like the ``CrsfPayload`` decoders.
+    """
+    head, variable, tail = split_fields(fields)
+
+    namespace = {}
+    lines = []
+    outputs = []
+
+    def layout(side_fields, prefix):
+        """Struct format and (field, raw expression) pairs of one side."""
+        codes = []
+        values = []
+        previous = None
+        for field in side_fields:
+            fmt = field[1]
+            if fmt is None:
+                values.append((field, previous))
+                continue
+            if fmt == 'x':
+                codes.append('x')
+                continue
+            index = len(codes) - codes.count('x')
+            if fmt == 'u24':
+                codes.extend(['B', 'H'])
+                previous = "(%s%d << 16 | %s%d)" % (prefix, index, prefix, index + 1)
+            else:
+                codes.append(fmt)
+                previous = "%s%d" % (prefix, index)
+            values.append((field, previous))
+        count = len(codes) - codes.count('x')
+        return '>' + ''.join(codes), count, values
+
+    def unpack(fmt, count, prefix, start):
+        """Statements reading the raw values of one side, ``start`` is the offset expression."""
+        if not count:
+            return
+        if set(fmt[1:]) <= {'B', 'x'}:
+            # Single bytes only, indexing is faster than unpacking
+            offsets = [i for i, code in enumerate(fmt[1:]) if code == 'B']
+            lines.append("    %s = %s" % (", ".join("%s%d" % (prefix, i) for i in range(count)),
+                                            ", ".join("payload[%s%d]" % (start, i) for i in offsets)))
+            return
+        key = prefix + "_struct"
+        namespace[key] = struct.Struct(fmt)
+        lines.append("    %s, = %s.unpack_from(payload, %s0)" % (
+            ", ".join("%s%d" % (prefix, i) for i in range(count)), key, start))
+
+    head_format, head_count, head_values = layout(head, 'h')
+    head_size = struct.calcsize(head_format)
+    unpack(head_format, head_count, 'h', '')
+
+    tail_format, tail_count, tail_values = layout(tail, 't')
+    tail_size = struct.calcsize(tail_format)
+    unpack(tail_format, tail_count, 't', 'len(payload) - %d + ' % tail_size)
+
+    for field, expression in head_values:
+        outputs.append("(%r, %s)" % (field[0], convert(field, expression, namespace)))
+    if variable is not None:
+        expression = variable_expression(variable, "payload[%d:len(payload) - %d]" % (head_size, tail_size))
+        outputs.append("(%r, %s)" % (variable[0], convert(variable, expression, namespace)))
+    for field, expression in tail_values:
+        outputs.append("(%r, %s)" % (field[0], convert(field, expression, namespace)))
+
+    source = "def %s(payload):\n%s\n    return (%s,)\n" % (name, "\n".join(lines), ", ".join(outputs))
+    exec(compile(source, "<schema %s>" % name, 'exec'), namespace)
+    return namespace[name]
+
+
+def compile_fields(fields):
+    """
+    Build a decode function per field from a payload layout (see compile_schema),
+    {name: function(payload) -> value}. Every function reads only the bytes of its field,
+    for consumers that need a field or two of a payload, not all of them.
+    """
+    head, variable, tail = split_fields(fields)
+    namespace = {}
+    expressions = []
+
+    def side(side_fields, start):
+        """Raw value expressions of one side, ``start`` is the offset expression of its first byte."""
+        offset = 0
+        previous = None
+        for field in side_fields:
+            fmt = field[1]
+            if fmt == 'x':
+                offset += 1
+                continue
+            if fmt == 'u24':
+                previous = "int.from_bytes(bytes(payload[%s%d:%s%d]), 'big')" % (start, offset, start, offset + 3)
+                offset += 3
+            elif fmt == 'B':
+                previous = "payload[%s%d]" % (start, offset)
+                offset += 1
+            elif fmt is not None:
+                key = "s%d" % len(namespace)
+                namespace[key] = struct.Struct('>' + fmt)
+                previous = "%s.unpack_from(payload, %s%d)[0]" % (key, start, offset)
+                offset += namespace[key].size
+            expressions.append((field, previous))
+
+    head_size = struct.calcsize('>' + ''.join('BBB' if i[1] == 'u24' else i[1] for i in head if i[1]))
+    tail_size = struct.calcsize('>' + ''.join('BBB' if i[1] == 'u24' else i[1] for i in tail if i[1]))
+    side(head, '')
+    if variable is not None:
+        expressions.append((variable, "payload[%d:len(payload) - %d]" % (head_size, tail_size)))
+    side(tail, 'len(payload) - %d + ' % tail_size)
+
+    decoders = {}
+    for field, expression in expressions:
+        if field[0] is None:
+            continue
+        if field is variable:
+            expression = variable_expression(variable, expression)
+        name = "decode_%s" % len(decoders)
+        source = "def %s(payload):\n    return %s\n" % (name, convert(field, expression, namespace))
+        exec(compile(source, "<schema field %s>" % field[0], 'exec'), namespace)
+        decoders[field[0]] = namespace[name]
+    return decoders
+
+
+def hardware_id(value):
+    """CrsfHardwareID of a hardware id (low 3 bits are the revision), None if unknown."""
+    try:
+        return CrsfHardwareID(value >> 3 << 3)
+    except ValueError:
+        return None
+
+
+# Payload layouts, frame type -> fields (see compile_schema)
+SCHEMAS = {
+    CrsfFrameType.GPS: (
+        ("latitude", 'i', 1e7),
+        ("longitude", 'i', 1e7),
+        ("ground speed", 'H', 10),  # km/h
+        ("heading", 'H', 100),  # degrees
+        ("altitude", 'H', lambda value: value - 1000),  # m
+        ("satellites", 'B'),
+    ),
+    CrsfFrameType.BATTERY_SENSOR: (
+        ("voltage", 'H', 10),
+        ("current", 'H', 10),
+        ("consumption", 'u24'),
+        ("battary procentage", 'B'),
+    ),
+    CrsfFrameType.LINK_STATISTICS: (
+        ("uplink RSSI 1", 'B', lambda value: -value),  # dBm
+        ("uplink RSSI 2", 'B', lambda value: -value),
+        ("uplink link quality", 'B'),  # %
+        ("uplink SNR", 'b'),  # dB
+        ("active antenna", 'B'),
+        ("RF mode", 'B'),
+        ("uplink TX power", 'B'),
+        ("downlink RSSI", 'B', lambda value: -value),
+        ("downlink link quality", 'B'),
+        ("downlink SNR", 'b'),
+    ),
+    CrsfFrameType.ATTITUDE: (
+        ("pitch", 'h', 1000),
+        ("roll", 'h', 1000),
+        ("yaw", 'h', 1000),
+    ),
+    CrsfFrameType.VTX: (
+        ("src address", 'B', lookup_frame_address),
+        ("comm mode", None, Bits(5, 3), CrsfVtxInterface),
+        ("is VTX available", None, Bits(4, 1)),
+        ("is manual freq", None, Bits(1, 1)),  # TODO: test
+        ("is PitMode", None, Bits(0, 1)),
+        (None, 'x'),
+        ("band", 'B'),
+        ("manual frequency", 'B'),
+        (None, 'x'),
+        ("PitMode", 'B', Bits(4, 4), CrsfVtxPitmode),
+        ("power", None, Bits(0, 3), CrsfVtxXPower),
+    ),
+    CrsfFrameType.DEVICE_PING: (
+        ("dst address", 'B', lookup_frame_address),
+        ("src address", 'B', lookup_frame_address),
+    ),
+    CrsfFrameType.DEVICE_INFO: (
+        ("dst address", 'B', lookup_frame_address),
+        ("src address", 'B', lookup_frame_address),
+        ("name", 'text'),
+        (None, 'x'),  # Zero byte
+        ("serial number", 'I'),
+        ("hardware id", 'I', hex),
+        ("hardware id (decoded)", None, hardware_id),
+        ("firmware id", 'I'),
+        ("parameter count", 'B'),
+        ("device info version", 'B'),
+    ),
+    CrsfFrameType.PARAMETER_READ: (
+        ("dst address", 'B', lookup_frame_address),
+        ("src address", 'B', lookup_frame_address),
+        ("parameter number", 'B'),
+        ("parameter chunk number", 'B'),
+    ),
+}
@@ -0,0 +1,295 @@
+import os
+import time
+import queue
+import select
+import socket
+import threading
+from collections import deque, OrderedDict
+
+from read_data import make_type_filter, LOG
+from crsf_codes import CrsfFrameType
+from crsf_output import ENCODERS
+
+
+QUEUE_SIZE = 1024  # frames per client
+DISPATCH_QUEUE_SIZE = 16 * 1024
+UDP_TIMEOUT = 10.0  # seconds a UDP subscriber stays without sending anything
+WAIT = 0.5  # seconds, how often client threads look for commands and closing
+
+POLICIES = ['drop', 'coalesce']
+
+
+def parse_types(value):
+    return [CrsfFrameType[i.strip()] for i in value.split(',') if i.strip()]
+
+
+class Client(object):
+    """
+    Subscriber with its own bounded queue, served by its own thread.
+
+    With ``drop`` policy the oldest frames are dropped when the queue is full, with ``coalesce``
+    only the latest frame of every type is kept, so a slow client always gets the newest values.
+    Clients can send commands, one per line: ``show TYPE,...``, ``skip TYPE,...`` or ``all``.
+    """
+
+    def __init__(self, server, name, sock, address=None, queue_size=QUEUE_SIZE, policy='drop'):
+        self.server = server
+        self.name = name
+        self.socket = sock
+        self.address = address  # UDP subscribers only
+        self.queue_size = queue_size
+        self.coalesce = policy == 'coalesce'
+        self.type_filter = None
+        self.frames_dropped = 0
+        self.frames_sent = 0
+        self.last_seen = None
+
+        self.condition = threading.Condition()
+        self.pending = OrderedDict() if self.coalesce else deque()
+        self.closed = False
+        self.thread = threading.Thread(target=self.__run, name="client-%s" % name)
+        self.thread.daemon = True
+
+    def wants(self, type_byte):
+        return self.type_filter is None or self.type_filter[type_byte]
+
+    def command(self, line):
+        words = line.strip().split(None, 1)
+        if not words:
+            return
+        try:
+            if words[0] == 'all':
+                self.type_filter = None
+            elif words[0] == 'show' and len(words) == 2:
+                self.type_filter = make_type_filter(show_types=parse_types(words[1]))
+            elif words[0] == 'skip' and len(words) == 2:
+                self.type_filter = make_type_filter(skip_types=parse_types(words[1]))
+            else:
+                LOG.error("Client %s - unknown command %r" % (self.name, line))
+        except KeyError as err:
+            LOG.error("Client %s - unknown frame type %s" % (self.name, err))
+
+    def put(self, type_byte, data):
+        with self.condition:
+            if self.coalesce:
+                if self.pending.pop(type_byte, None) is not None:
+                    self.frames_dropped += 1
+                self.pending[type_byte] = data
+            else:
+                if len(self.pending) >= self.queue_size:
+                    self.pending.popleft()
+                    self.frames_dropped += 1
+                self.pending.append(data)
+            self.condition.notify()
+
+    def take(self):
+        """All queued data, waits up to WAIT seconds for some."""
+        with self.condition:
+            if not self.pending and not self.closed:
+                self.condition.wait(WAIT)
+            if self.coalesce:
+                batch = list(self.pending.values())
+            else:
+                batch = list(self.pending)
+            self.pending.clear()
+            return batch
+
+    def start(self):
+        self.thread.start()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.address is None:
+            try:
+                # Wakes up a send blocked by a client that does not read
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __read_commands(self, buffer):
+        while select.select([self.socket], [], [], 0)[0]:
+            data = self.socket.recv(4096)
+            if not data:
+                return None
+            buffer += data
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                self.command(line.decode('ascii', 'replace'))
+        return buffer
+
+    def __run(self):
+        buffer = b''
+        try:
+            while not self.closed:
+                if self.address is None:
+                    buffer = self.__read_commands(buffer)
+                    if buffer is None:
+                        break
+                batch = self.take()
+                if not batch:
+                    continue
+                if self.address is None:
+                    self.socket.sendall(b''.join(batch))
+                else:
+                    for data in batch:
+                        self.socket.sendto(data, self.address)
+                self.frames_sent += len(batch)
+        except (OSError, ValueError) as err:
+            if not self.closed:
+                LOG.info("Client %s - %s" % (self.name, err))
+        finally:
+            self.closed = True
+            self.server.remove(self)
+            if self.address is None:
+                self.socket.close()
+
+
+class FrameServer(object):
+    """
+    Publishes frames read once to many local clients.
+
+    ``addresses`` are ``tcp:<host>:<port>``, ``udp:<host>:<port>`` or ``unix:<path>``.
+    Stream clients just connect, UDP clients subscribe by sending any datagram (or a command)
+    and have to send one at least every UDP_TIMEOUT seconds.
+
+    By default ``publish`` never blocks the reader: frames go through a bounded dispatch queue
+    (dropped and counted when full) to a thread that encodes every frame once
+    in ``output_format`` and puts it into the queues of the clients that want its type.
+    With ``drop=False`` (file reading) ``publish`` waits for the dispatch queue instead.
+    """
+
+    def __init__(self, addresses, output_format='json', queue_size=QUEUE_SIZE, policy='drop', drop=True):
+        self.encode = ENCODERS[output_format]
+        self.queue_size = queue_size
+        self.policy = policy
+        self.drop = drop
+        self.clients = []
+        self.udp_clients = {}  # (socket, address) -> Client
+        self.lock = threading.Lock()
+        self.frames_dropped = 0
+        self.counter = 0
+
+        self.sockets = []
+        self.unix_paths = []
+        for address in addresses:
+            self.sockets.append(self.__listen(address))
+
+        self.stopped = threading.Event()
+        self.queue = queue.Queue(DISPATCH_QUEUE_SIZE)
+        self.threads = [threading.Thread(target=self.__dispatch, name="dispatch"),
+                        threading.Thread(target=self.__accept, name="accept")]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def __listen(self, address):
+        kind, _, rest = address.partition(':')
+        if kind == 'unix':
+            if os.path.exists(rest):
+                os.remove(rest)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.bind(rest)
+            self.unix_paths.append(rest)
+        elif kind in ['tcp', 'udp']:
+            host, port = rest.rsplit(':', 1)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM if kind == 'tcp' else socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((host, int(port)))
+        else:
+            raise ValueError("Unknown address %r, expected tcp:<host>:<port>, udp:<host>:<port> or unix:<path>" %
+                             address)
+        if sock.type == socket.SOCK_STREAM:
+            sock.listen(16)
+        LOG.info("Serving frames on %s" % address)
+        return sock
+
+    def add(self, client):
+        with self.lock:
+            self.clients.append(client)
+        client.start()
+        LOG.info("Client %s connected" % client.name)
+
+    def remove(self, client):
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+                self.udp_clients.pop((client.socket, client.address), None)
+                LOG.info("Client %s disconnected, %s frames sent, %s dropped" % (
+                    client.name, client.frames_sent, client.frames_dropped))
+
+    def __accept(self):
+        while not self.stopped.is_set():
+            try:
+                readable = select.select(self.sockets, [], [], WAIT)[0]
+            except (OSError, ValueError):
+                break
+            for sock in readable:
+                if sock.type == socket.SOCK_STREAM:
+                    connection, address = sock.accept()
+                    self.counter += 1
+                    self.add(Client(self, "%s/%s" % (self.counter, address or 'unix'), connection,
+                                    queue_size=self.queue_size, policy=self.policy))
+                else:
+                    data, address = sock.recvfrom(4096)
+                    client = self.udp_clients.get((sock, address))
+                    if client is None:
+                        self.counter += 1
+                        client = Client(self, "%s/%s" % (self.counter, address), sock, address,
+                                        queue_size=self.queue_size, policy=self.policy)
+                    client.last_seen = time.monotonic()
+                    for line in data.decode('ascii', 'replace').splitlines():
+                        client.command(line)
+                    if (sock, address) not in self.udp_clients:
+                        self.udp_clients[(sock, address)] = client
+                        self.add(client)
+            self.__expire_udp()
+
+    def __expire_udp(self):
+        now = time.monotonic()
+        for client in list(self.udp_clients.values()):
+            if now - client.last_seen > UDP_TIMEOUT:
+                client.close()
+
+    def publish(self, frame):
+        if not self.drop:
+            self.queue.put(frame)
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def __dispatch(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            type_byte = getattr(frame.frame_type, 'value', frame.frame_type)
+            with self.lock:
+                clients = [i for i in self.clients if i.wants(type_byte)]
+            if not clients:
+                continue
+            try:
+                data = self.encode(frame)
+            except Exception as err:
+                LOG.error("Frame encoding failed - %r" % err)
+                continue
+            for client in clients:
+                client.put(type_byte, data)
+
+    def close(self):
+        self.stopped.set()
+        self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.close()
+            client.thread.join()
+        for sock in self.sockets:
+            sock.close()
+        for path in self.unix_paths:
+            os.remove(path)
@@ -0,0 +1,175 @@
+from crsf_codes import CrsfFrameType, lookup_frame_type, lookup_or_value
+
+
+FLIGHT_MODE = CrsfFrameType.FLIGHT_MODE.value
+BATTERY_SENSOR = CrsfFrameType.BATTERY_SENSOR.value
+HEARTBEAT = CrsfFrameType.HEARTBEAT.value
+LINK_STATISTICS = CrsfFrameType.LINK_STATISTICS.value
+
+GAP = 2.0  # seconds without frames that end a session
+HEARTBEAT_TIMEOUT = 3.0  # seconds without heartbeat, once heartbeats were seen
+
+
+class Segment(object):
+    """
+    Running summary of a part of a session with the same arm state.
+
+    Only aggregates are kept, frames are not. Times are None for logs without timestamps.
+    """
+
+    def __init__(self, session, number, armed, frame):
+        self.session = session
+        self.number = number
+        self.armed = armed
+        self.mode = None
+        self.start_offset = frame.offset
+        self.end_offset = frame.offset
+        self.start_time = frame.timestamp
+        self.end_time = frame.timestamp
+        self.frames = 0
+        self.types = [0] * 256
+        self.min_voltage = None
+        self.max_current = None
+        self.consumption_start = None
+        self.consumption_end = None
+        self.min_link_quality = None
+        self.link_losses = 0
+
+    def add(self, frame, frame_type):
+        self.frames += 1
+        self.types[frame_type] += 1
+        self.end_offset = frame.offset
+        if frame.timestamp is not None:
+            self.end_time = frame.timestamp
+            if self.start_time is None:
+                self.start_time = frame.timestamp
+
+    def add_battery(self, voltage, current, consumption):
+        if self.min_voltage is None or voltage < self.min_voltage:
+            self.min_voltage = voltage
+        if self.max_current is None or current > self.max_current:
+            self.max_current = current
+        if self.consumption_start is None:
+            self.consumption_start = consumption
+        self.consumption_end = consumption
+
+    def add_link_quality(self, link_quality, lost):
+        if self.min_link_quality is None or link_quality < self.min_link_quality:
+            self.min_link_quality = link_quality
+        if lost:
+            self.link_losses += 1
+
+    @property
+    def duration(self):
+        if self.start_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    def summary(self):
+        return {
+            'session': self.session,
+            'segment': self.number,
+            'kind': 'flight' if self.armed else 'ground',
+            'mode': self.mode,
+            'start_offset': self.start_offset,
+            'end_offset': self.end_offset,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'duration': self.duration,
+            'frames': self.frames,
+            'types': dict((getattr(lookup_or_value(lookup_frame_type, i), 'name', i), count)
+                          for i, count in enumerate(self.types) if count),
+            'min_voltage': self.min_voltage,
+            'max_current': self.max_current,
+            'consumption': None if self.consumption_start is None else self.consumption_end - self.consumption_start,
+            'min_link_quality': self.min_link_quality,
+            'link_losses': self.link_losses,
+        }
+
+
+class SessionAnalyzer(object):
+    """
+    Single pass segmentation of a frame stream into sessions and flights.
+
+    A new session starts after a gap of ``gap`` seconds without frames, ``heartbeat_timeout``
+    seconds without HEARTBEAT (once they were seen), or when battery consumption goes back
+    (flight controller power cycle). Inside a session a new segment starts whenever
+    FLIGHT_MODE changes arm state. Feed frames with ``add_frame``, it returns the summary
+    dict of a finished segment; ``close`` returns the last one.
+
+    Fields are read from raw payloads, frames do not have to be decoded.
+    """
+
+    def __init__(self, gap=GAP, heartbeat_timeout=HEARTBEAT_TIMEOUT):
+        self.gap = gap
+        self.heartbeat_timeout = heartbeat_timeout
+        self.segment = None
+        self.sessions = 0
+        self.segments = 0
+        self.armed = False
+        self.last_time = None
+        self.last_heartbeat = None
+        self.last_consumption = None
+        self.link_up = True
+
+    def new_session(self, frame):
+        self.sessions += 1
+        self.last_heartbeat = None
+        self.last_consumption = None
+        self.link_up = True
+        return self.new_segment(frame, False)
+
+    def new_segment(self, frame, armed):
+        finished = self.close()
+        self.armed = armed
+        self.segments += 1
+        self.segment = Segment(self.sessions, self.segments, armed, frame)
+        return finished
+
+    def add_frame(self, frame):
+        frame_type = getattr(frame.frame_type, 'value', frame.frame_type)
+        payload = frame.payload.payload_raw
+        now = frame.timestamp
+        finished = None
+
+        if self.segment is None:
+            finished = self.new_session(frame)
+        elif now is not None and self.last_time is not None and now - self.last_time > self.gap:
+            finished = self.new_session(frame)
+        elif now is not None and self.last_heartbeat is not None and \
+                now - self.last_heartbeat > self.heartbeat_timeout:
+            finished = self.new_session(frame)
+        if now is not None:
+            self.last_time = now
+
+        if frame_type == HEARTBEAT:
+            self.last_heartbeat = now
+        elif frame_type == BATTERY_SENSOR and len(payload) >= 8:
+            consumption = (payload[4] << 16) + (payload[5] << 8) + payload[6]
+            if self.last_consumption is not None and consumption < self.last_consumption:
+                finished = self.new_session(frame) or finished
+            self.last_consumption = consumption
+            self.segment.add_battery(float((payload[0] << 8) + payload[1]) / 10,
+                                     float((payload[2] << 8) + payload[3]) / 10, consumption)
+        elif frame_type == LINK_STATISTICS and len(payload) >= 3:
+            # Uplink RSSI antenna 1, antenna 2, uplink link quality, ...
+            link_quality = payload[2]
+            lost = self.link_up and link_quality == 0
+            self.link_up = link_quality > 0
+            self.segment.add_link_quality(link_quality, lost)
+        elif frame_type == FLIGHT_MODE and len(payload) >= 2:
+            armed = payload[-2] != ord('*')
+            if armed != self.armed:
+                finished = self.new_segment(frame, armed) or finished
+            end = -1 if armed else -2
+            self.segment.mode = bytes(payload[0:end]).decode('ascii', 'replace')
+
+        self.segment.add(frame, frame_type)
+        return finished
+
+    def close(self):
+        """Summary of the current segment, None if there is none or it is empty."""
+        segment, self.segment = self.segment, None
+        if segment is None or not segment.frames:
+            return None
+        return segment.summary()
@@ -0,0 +1,299 @@
+import time
+import struct
+import argparse
+import itertools
+
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None
+
+from crsf_codes import CrsfFrameType
+
+
+MAGIC = b'CRSF'
+VERSION = 1
+RING_SIZE = 1024  # frames
+MAX_FRAME_SIZE = 64
+SPINS = 100  # reads of a slot that is being written before waiting
+TIMEOUT = 0.1  # seconds a slot can stay locked before the publisher is taken as dead
+
+# Latest values, frame type -> (decoded field name, struct format), formats with a count are lists
+VALUES = (
+    (CrsfFrameType.RC_CHANNELS_PACKED, (
+        ("channels us", '16d'),
+    )),
+    (CrsfFrameType.ATTITUDE, (
+        ("pitch", 'd'),
+        ("roll", 'd'),
+        ("yaw", 'd'),
+    )),
+    (CrsfFrameType.BATTERY_SENSOR, (
+        ("voltage", 'd'),
+        ("current", 'd'),
+        ("consumption", 'I'),
+        ("battary procentage", 'B'),
+    )),
+    (CrsfFrameType.FLIGHT_MODE, (
+        ("mode", '16s'),
+        ("is_armed", '?'),
+    )),
+    (CrsfFrameType.LINK_STATISTICS, (
+        ("uplink RSSI 1", 'h'),
+        ("uplink RSSI 2", 'h'),
+        ("uplink link quality", 'B'),
+        ("uplink SNR", 'b'),
+        ("active antenna", 'B'),
+        ("RF mode", 'B'),
+        ("uplink TX power", 'B'),
+        ("downlink RSSI", 'h'),
+        ("downlink link quality", 'B'),
+        ("downlink SNR", 'b'),
+    )),
+)
+
+# Segment layout, little-endian, every block 8 byte aligned:
+#   header: magic, version, ring size
+#   value slot per VALUES entry: sequence, update count, timestamp, fields
+#   ring: frames written, then ring size frame slots: sequence, length, timestamp, raw frame
+HEADER = struct.Struct('<4sII4x')
+SLOT_HEADER = struct.Struct('<IId')
+SEQUENCE = struct.Struct('<I')
+WRITTEN = struct.Struct('<Q')
+FRAME_HEADER = struct.Struct('<IB3xd')
+FRAME_SLOT_SIZE = FRAME_HEADER.size + MAX_FRAME_SIZE
+MASK = 0xFFFFFFFF  # sequence numbers and counts wrap around
+
+CREATED = set()  # segments published by this process (or its parent, after fork)
+
+
+def align(size):
+    return (size + 7) & ~7
+
+
+class ValueSlot(object):
+    """Place and layout of the latest values of one frame type."""
+
+    def __init__(self, frame_type, fields, offset):
+        self.frame_type = frame_type
+        self.fields = fields
+        self.offset = offset
+        self.data = struct.Struct('<' + ''.join(fmt for name, fmt in fields))
+        self.size = align(SLOT_HEADER.size + self.data.size)
+
+    def pack(self, payload):
+        # All fields are needed, one decode of the whole payload is cheaper than one per field
+        fields = dict(payload.fields)
+        values = []
+        for name, fmt in self.fields:
+            value = fields.get(name)
+            if fmt[0].isdigit() and not fmt.endswith('s'):
+                values.extend(value)
+            elif fmt.endswith('s'):
+                values.append(value.encode('ascii', 'replace'))
+            else:
+                values.append(value)
+        return values
+
+    def unpack(self, values):
+        result = {}
+        index = 0
+        for name, fmt in self.fields:
+            if fmt[0].isdigit() and not fmt.endswith('s'):
+                count = int(fmt[:-1])
+                result[name] = list(values[index:index + count])
+                index += count
+            elif fmt.endswith('s'):
+                result[name] = values[index].rstrip(b'\0').decode('ascii', 'replace')
+                index += 1
+            else:
+                result[name] = values[index]
+                index += 1
+        return result
+
+
+def layout(ring_size):
+    """Value slots by frame type byte, ring offset and total segment size."""
+    slots = {}
+    offset = HEADER.size
+    for frame_type, fields in VALUES:
+        slot = ValueSlot(frame_type, fields, offset)
+        slots[frame_type.value] = slot
+        offset += slot.size
+    return slots, offset, offset + WRITTEN.size + ring_size * FRAME_SLOT_SIZE
+
+
+class SharedState(object):
+    """
+    Latest decoded values and recent frames in a shared memory segment.
+
+    The publisher (``create=True``) owns the segment, calls ``publish`` for every frame and
+    removes the segment on ``close``. Readers in other processes attach by name and read
+    with ``values`` and ``frames`` straight from the shared buffer, without system calls
+    (unless the publisher is preempted in the middle of a write).
+
+    Every slot has a sequence number (seqlock): the publisher makes it odd before writing
+    and even after, a reader retries while it is odd or changed during the read.
+    There is one publisher, readers never block it.
+    """
+
+    def __init__(self, name=None, create=False, ring_size=RING_SIZE):
+        if shared_memory is None:
+            raise ImportError("multiprocessing.shared_memory (Python 3.8+) is required")
+
+        if create:
+            slots, ring_offset, size = layout(ring_size)
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+            HEADER.pack_into(self.memory.buf, 0, MAGIC, VERSION, ring_size)
+            CREATED.add(self.memory.name)
+        else:
+            try:
+                self.memory = shared_memory.SharedMemory(name=name, track=False)
+            except TypeError:
+                # Before Python 3.13, the segment belongs to the publisher,
+                # do not let the tracker remove it when this process exits
+                self.memory = shared_memory.SharedMemory(name=name)
+                if self.memory.name not in CREATED:
+                    resource_tracker.unregister(self.memory._name, 'shared_memory')
+            magic, version, ring_size = HEADER.unpack_from(self.memory.buf, 0)
+            if magic != MAGIC or version != VERSION:
+                self.memory.close()
+                raise ValueError("Not a frame state segment: %s" % name)
+            slots, ring_offset, size = layout(ring_size)
+
+        self.name = self.memory.name
+        self.create = create
+        self.buffer = self.memory.buf
+        self.slots = slots
+        self.ring_offset = ring_offset
+        self.ring_size = ring_size
+        self.frames_written = 0
+        self.frames_failed = 0
+
+    def publish(self, frame):
+        """Store the frame in the ring and its decoded values if the type has a value slot."""
+        buf = self.buffer
+        raw = frame.raw
+        timestamp = float('nan') if frame.timestamp is None else frame.timestamp
+
+        offset = self.ring_offset + WRITTEN.size + (self.frames_written % self.ring_size) * FRAME_SLOT_SIZE
+        sequence = SEQUENCE.unpack_from(buf, offset)[0]
+        SEQUENCE.pack_into(buf, offset, (sequence + 1) & MASK)
+        FRAME_HEADER.pack_into(buf, offset, (sequence + 1) & MASK, len(raw), timestamp)
+        start = offset + FRAME_HEADER.size
+        buf[start:start + len(raw)] = bytes(raw)
+        SEQUENCE.pack_into(buf, offset, (sequence + 2) & MASK)
+        self.frames_written += 1
+        WRITTEN.pack_into(buf, self.ring_offset, self.frames_written)
+
+        slot = self.slots.get(getattr(frame.frame_type, 'value', frame.frame_type))
+        if slot is None:
+            return
+        try:
+            data = slot.data.pack(*slot.pack(frame.payload))
+        except (TypeError, AttributeError, UnicodeError, struct.error):
+            # Decode error, fields missing or out of range
+            self.frames_failed += 1
+            return
+        offset = slot.offset
+        sequence, count, _ = SLOT_HEADER.unpack_from(buf, offset)
+        SEQUENCE.pack_into(buf, offset, (sequence + 1) & MASK)
+        SLOT_HEADER.pack_into(buf, offset, (sequence + 1) & MASK, (count + 1) & MASK, timestamp)
+        start = offset + SLOT_HEADER.size
+        buf[start:start + len(data)] = data
+        SEQUENCE.pack_into(buf, offset, (sequence + 2) & MASK)
+
+    def values(self, frame_type):
+        """
+        (timestamp, update count, {field: value}) of the latest frame of the type,
+        None if there was none yet.
+        """
+        slot = self.slots[getattr(frame_type, 'value', frame_type)]
+        buf = self.buffer
+        offset = slot.offset
+        deadline = None
+        for attempt in itertools.count():
+            sequence, count, timestamp = SLOT_HEADER.unpack_from(buf, offset)
+            if not sequence & 1:
+                values = slot.data.unpack_from(buf, offset + SLOT_HEADER.size)
+                if SEQUENCE.unpack_from(buf, offset)[0] == sequence:
+                    if not count:
+                        return None
+                    return timestamp, count, slot.unpack(values)
+            if attempt >= SPINS:
+                # The publisher was preempted while writing, give it the CPU
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + TIMEOUT
+                elif now > deadline:
+                    raise RuntimeError("%s values are locked for too long" % slot.frame_type.name)
+                time.sleep(0)
+
+    def frames(self, position=None):
+        """
+        Frames published since ``position`` (frames written count), oldest first.
+
+        Returns ([(timestamp, raw bytes), ...], new position, frames lost), frames are lost
+        when the reader falls more than the ring size behind. Without ``position``
+        returns no frames and the current position.
+        """
+        buf = self.buffer
+        written = WRITTEN.unpack_from(buf, self.ring_offset)[0]
+        if position is None:
+            return [], written, 0
+        lost = 0
+        if written - position > self.ring_size:
+            lost = written - position - self.ring_size
+            position = written - self.ring_size
+
+        frames = []
+        base = self.ring_offset + WRITTEN.size
+        while position < written:
+            offset = base + (position % self.ring_size) * FRAME_SLOT_SIZE
+            # The slot holds this frame until the publisher wraps around, sequence tells how often it was written
+            expected = 2 * (position // self.ring_size + 1) & MASK
+            sequence, length, timestamp = FRAME_HEADER.unpack_from(buf, offset)
+            start = offset + FRAME_HEADER.size
+            raw = bytes(buf[start:start + length])
+            if sequence != expected or SEQUENCE.unpack_from(buf, offset)[0] != sequence:
+                # Overwritten while reading
+                lost += 1
+            else:
+                frames.append((timestamp, raw))
+            position += 1
+        return frames, position, lost
+
+    def close(self):
+        self.buffer = None
+        self.memory.close()
+        if self.create:
+            self.memory.unlink()
+            CREATED.discard(self.name)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Show values published by read_data.py --shm')
+    parser.add_argument("--name", action="store", required=True, help="Shared memory segment name")
+    parser.add_argument("--interval", action="store", type=float, default=1.0, help="Seconds between updates")
+    parser.add_argument("--frames", action="store_true", help="Also show the number of new frames")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    state = SharedState(args.name)
+    position = state.frames()[1]
+    try:
+        while True:
+            for frame_type, fields in VALUES:
+                current = state.values(frame_type)
+                if current is not None:
+                    print("%s #%s: %s" % (frame_type.name, current[1], current[2]))
+            if args.frames:
+                frames, position, lost = state.frames(position)
+                print("Frames: %s new, %s lost" % (len(frames), lost))
+            time.sleep(args.interval)
+    except KeyboardInterrupt as err:
+        print(err)
+    state.close()
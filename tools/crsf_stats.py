@@ -0,0 +1,186 @@
+import time
+import threading
+from collections import deque
+
+from crsf_codes import CrsfFrameType
+
+
+INTERVAL = 1.0  # seconds
+WINDOW = 10.0  # seconds
+JITTER_SAMPLES = 1000
+HISTOGRAM_BUCKETS = 32  # log2 of nanoseconds
+
+
+def histogram_percentile(histogram, percent):
+    """Upper bound (ns) of the log2 bucket holding given percentile."""
+    total = sum(histogram)
+    if total == 0:
+        return 0
+    limit = total * percent / 100.0
+    count = 0
+    for bucket, value in enumerate(histogram):
+        count += value
+        if count >= limit:
+            return 1 << bucket
+    return 1 << (len(histogram) - 1)
+
+
+def stdev(values):
+    if len(values) < 2:
+        return 0.0
+    mean = sum(values) / len(values)
+    return (sum((i - mean) ** 2 for i in values) / (len(values) - 1)) ** 0.5
+
+
+class LiveStats(object):
+    """
+    Live reader statistics over a sliding window.
+
+    Frames are fed with ``update``, reader counters are sampled every ``interval``
+    seconds from a background thread. Every sample builds a snapshot dict, which
+    is passed to registered callbacks and, if ``log`` is given, logged as one status line:
+
+        {'time', 'bytes_per_second', 'frames_per_second', 'crc_error_rate', 'frames_bad',
+         'types': {name: {'rate', 'jitter'}},
+         'decode_time': {name: {'count', 'mean', 'p50', 'p99', 'histogram'}}}
+
+    Jitter is the deviation of the last JITTER_SAMPLES inter-frame intervals (seconds) of
+    ``frame.arrival``, estimated by the reader from the chunk read time, byte offset and baud rate.
+    It is None without arrival times (plain files), rates are then processing rates.
+    Decode times (ns) are collected since ``instrument`` in log2 buckets.
+    """
+
+    def __init__(self, reader, interval=INTERVAL, window=WINDOW, log=None):
+        self.reader = reader
+        self.interval = interval
+        self.window = window
+        self.log = log
+        self.callbacks = []
+
+        self.type_counts = {}
+        self.last_seen = {}
+        self.intervals = {}
+        self.decode_times = {}
+        self.decode_totals = {}
+
+        self.samples = deque()
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def add_callback(self, func):
+        self.callbacks.append(func)
+
+    def instrument(self, decoders):
+        """Wrap every decoder of a ``read_data.DECODERS`` registry with a timer."""
+        for type_byte, func in list(decoders.items()):
+            decoders[type_byte] = self.__timed(type_byte, func)
+
+    def __timed(self, type_byte, func):
+        try:
+            name = CrsfFrameType(type_byte).name
+        except ValueError:
+            name = hex(type_byte)
+        histogram = self.decode_times.setdefault(name, [0] * HISTOGRAM_BUCKETS)
+        totals = self.decode_totals.setdefault(name, [0, 0])  # count, ns
+        last_bucket = HISTOGRAM_BUCKETS - 1
+
+        def timed(payload):
+            start = time.perf_counter_ns()
+            try:
+                return func(payload)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                histogram[min(elapsed.bit_length(), last_bucket)] += 1
+                totals[0] += 1
+                totals[1] += elapsed
+
+        return timed
+
+    def update(self, frame):
+        name = frame.frame_type.name
+        self.type_counts[name] = self.type_counts.get(name, 0) + 1
+
+        now = frame.arrival
+        if now is None:
+            # Plain files: no arrival times, processing times say nothing about the link
+            return
+        last = self.last_seen.get(name)
+        self.last_seen[name] = now
+        if last is not None:
+            samples = self.intervals.get(name)
+            if samples is None:
+                samples = self.intervals[name] = deque(maxlen=JITTER_SAMPLES)
+            samples.append(now - last)
+
+    def sample(self):
+        """Take a counters sample and return the snapshot for the current window."""
+        now = time.monotonic()
+        reader = self.reader
+        self.samples.append((now, reader.bytes_total, reader.frames_total, reader.crc_ok,
+                             reader.crc_wrong, reader.frames_bad, self.type_counts.copy()))
+        while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+        first, last = self.samples[0], self.samples[-1]
+        elapsed = last[0] - first[0]
+        crc_total = (last[3] - first[3]) + (last[4] - first[4])
+
+        snapshot = {
+            'time': time.time(),
+            'bytes_per_second': (last[1] - first[1]) / elapsed if elapsed else 0.0,
+            'frames_per_second': (last[2] - first[2]) / elapsed if elapsed else 0.0,
+            'crc_error_rate': float(last[4] - first[4]) / crc_total if crc_total else 0.0,
+            'frames_bad': last[5] - first[5],
+            'types': {},
+            'decode_time': {},
+        }
+        for name, count in last[6].items():
+            snapshot['types'][name] = {
+                'rate': (count - first[6].get(name, 0)) / elapsed if elapsed else 0.0,
+                'jitter': stdev(list(self.intervals[name])) if name in self.intervals else None,
+            }
+        for name, histogram in self.decode_times.items():
+            count, total = self.decode_totals[name]
+            if not count:
+                continue
+            snapshot['decode_time'][name] = {
+                'count': count,
+                'mean': total / count,
+                'p50': histogram_percentile(histogram, 50),
+                'p99': histogram_percentile(histogram, 99),
+                'histogram': list(histogram),
+            }
+        return snapshot
+
+    def status_line(self, snapshot):
+        line = "%.1f kB/s, %.0f frames/s, CRC errors %.2f%%" % (
+            snapshot['bytes_per_second'] / 1000, snapshot['frames_per_second'], snapshot['crc_error_rate'] * 100)
+        for name, stats in sorted(snapshot['types'].items()):
+            line += " | %s %.1fHz" % (name, stats['rate'])
+            if stats['jitter'] is not None:
+                line += " arrival jitter %.2fms" % (stats['jitter'] * 1000)
+        return line
+
+    def tick(self):
+        snapshot = self.sample()
+        for func in self.callbacks:
+            func(snapshot)
+        if self.log is not None:
+            self.log.info(self.status_line(snapshot))
+        return snapshot
+
+    def start(self):
+        self.sample()
+        self.thread = threading.Thread(target=self.__run, name="live-stats")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __run(self):
+        while not self.stopped.wait(self.interval):
+            self.tick()
@@ -0,0 +1,122 @@
+import random
+import struct
+
+from crsf_crc import crc8
+from crsf_codes import CrsfFrameType, CrsfFrameAddress
+from msp_codes import MspCodes
+
+
+SYNC_BYTE = 0xC8
+
+# Frame type -> relative frequency, roughly as seen on a link with telemetry
+DEFAULT_MIX = {
+    CrsfFrameType.RC_CHANNELS_PACKED: 50,
+    CrsfFrameType.LINK_STATISTICS: 10,
+    CrsfFrameType.BATTERY_SENSOR: 5,
+    CrsfFrameType.ATTITUDE: 10,
+    CrsfFrameType.MSP_RESP: 2,
+}
+
+MSP_CHUNK_SIZE = 57  # 58 bytes after addresses, minus status byte
+MSP_START = 0x10
+MSP_VERSION_1 = 0x20
+
+
+def make_frame(frame_type, payload, address=SYNC_BYTE):
+    body = bytes([getattr(frame_type, 'value', frame_type)]) + bytes(payload)
+    return bytes([address, len(body) + 1]) + body + bytes([crc8(body)])
+
+
+def msp_chunks(code, data, seq, dst=CrsfFrameAddress.RADIO_TRANSMITTER.value,
+               src=CrsfFrameAddress.FLIGHT_CONTROLLER.value, chunk_size=MSP_CHUNK_SIZE):
+    """
+    Split an MSP v1 message into MSP over CRSF chunk payloads.
+
+    Every chunk is dst, src, status byte (sequence, start flag, version) and data.
+    Message is size, code, data and XOR checksum of size, code and data.
+    """
+    message = bytes([len(data), code]) + bytes(data)
+    checksum = 0
+    for byte in message:
+        checksum ^= byte
+    message += bytes([checksum])
+
+    chunks = []
+    for index, start in enumerate(range(0, len(message), chunk_size)):
+        status = ((seq + index) & 0x0F) | MSP_VERSION_1
+        if index == 0:
+            status |= MSP_START
+        chunks.append(bytes([dst, src, status]) + message[start:start + chunk_size])
+    return chunks
+
+
+class StreamGenerator(object):
+    """
+    Synthetic CRSF byte stream.
+
+    ``noise`` is the probability of garbage bytes before a frame,
+    ``corrupt`` the probability of a frame with broken CRC.
+    """
+
+    def __init__(self, seed=0, mix=None, noise=0.01, corrupt=0.001, max_noise=16):
+        self.random = random.Random(seed)
+        self.mix = mix or DEFAULT_MIX
+        self.types = list(self.mix)
+        self.weights = [self.mix[i] for i in self.types]
+        self.noise = noise
+        self.corrupt = corrupt
+        self.max_noise = max_noise
+        self.msp_seq = 0
+        self.msp_codes = [i.value for i in MspCodes]
+        self.pending = []
+
+    def payload_rc_channels_packed(self):
+        value = 0
+        for i in range(16):
+            value |= self.random.randint(172, 1811) << (11 * i)
+        return value.to_bytes(22, 'little')
+
+    def payload_link_statistics(self):
+        return bytes(self.random.randrange(256) for _ in range(10))
+
+    def payload_battery_sensor(self):
+        return struct.pack('>HH', self.random.randint(100, 252), self.random.randint(0, 1200)) + \
+            self.random.randint(0, 5000).to_bytes(3, 'big') + bytes([self.random.randint(0, 100)])
+
+    def payload_attitude(self):
+        return struct.pack('>hhh', *(self.random.randint(-3142, 3142) for _ in range(3)))
+
+    def frame(self):
+        if self.pending:
+            return make_frame(CrsfFrameType.MSP_RESP, self.pending.pop(0))
+
+        frame_type = self.random.choices(self.types, self.weights)[0]
+        if frame_type == CrsfFrameType.MSP_RESP:
+            data = bytes(self.random.randrange(256) for _ in range(self.random.randint(1, 200)))
+            self.pending = msp_chunks(self.random.choice(self.msp_codes), data, self.msp_seq)
+            self.msp_seq = (self.msp_seq + len(self.pending)) & 0x0F
+            return make_frame(CrsfFrameType.MSP_RESP, self.pending.pop(0))
+
+        payload = getattr(self, "payload_{}".format(frame_type.name).lower())()
+        return make_frame(frame_type, payload)
+
+    def chunk(self, size):
+        """At least ``size`` bytes of stream."""
+        data = bytearray()
+        while len(data) < size:
+            if self.random.random() < self.noise:
+                data += bytes(self.random.randrange(256) for _ in range(self.random.randint(1, self.max_noise)))
+            frame = bytearray(self.frame())
+            if self.random.random() < self.corrupt:
+                frame[-1] ^= 0xFF
+            data += frame
+        return bytes(data)
+
+    def write(self, path, size, chunk_size=1024 * 1024):
+        with open(path, 'wb') as target:
+            written = 0
+            while written < size:
+                data = self.chunk(min(chunk_size, size - written))
+                target.write(data)
+                written += len(data)
+        return written
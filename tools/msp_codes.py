@@ -1,5 +1,7 @@
 from enum import Enum
 
+from crsf_codes import enum_lookup
+
 # = https://github.com/betaflight/betaflight/blob/master/src/main/msp/msp_protocol.h
 class MspCodes(Enum):
     MSP_UNKNOWN_0x00 = 0
@@ -211,3 +213,6 @@ class MspCodes(Enum):
     MSP_RTC = 247
     MSP_SET_BOARD_INFO = 248
     MSP_SET_SIGNATURE = 249
+
+
+lookup_msp_code = enum_lookup(MspCodes)
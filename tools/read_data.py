@@ -1,30 +1,52 @@
 #!/usr/bin/env python
+import os
 import sys
+import json
 import argparse
 import logging
-import struct
+import mmap
+import time
 
 import serial
-from enum import Enum
 
-from msp_codes import MspCodes
-from crsf_crc import CrsfCrc, calc_crc
-from crsf_codes import CrsfFrameAddress, CrsfFrameType, CrsfCommandID,\
-    CrsfDataType, CrsfVtxXPower, CrsfVtxPitmode, CrsfVtxInterface, CrsfHardwareID
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from msp_codes import lookup_msp_code
+from crsf_crc import CrsfCrc, crc8, command_crc, verify_crc_batch
+from crsf_channels import unpack_channels, ticks_to_us
+from crsf_export import ColumnarExporter, EXPORT_FORMATS
+from crsf_capture import CaptureWriter, CaptureFile, is_capture
+from crsf_stats import LiveStats
+from crsf_output import OutputSink, OUTPUT_FORMATS, frame_lines
+from crsf_msp import MspReassembler
+from crsf_params import ParameterCache
+from crsf_devices import DeviceRegistry
+from crsf_sessions import SessionAnalyzer
+from crsf_schema import SCHEMAS, compile_schema, compile_fields
+from crsf_shm import SharedState
+from crsf_codes import CrsfFrameType, CrsfCommandID,\
+    lookup_frame_address, lookup_frame_type, lookup_or_value
 
 
 SYNC_BYTE = 0xC8
+SYNC = bytes([SYNC_BYTE])
 MAX_FRAME_SYZE = 62
+CHUNK_SIZE = 64 * 1024
+CRC_WINDOW = 32 * 1024  # bytes ahead of the scan verified by one verify_crc_batch call
+BITS_PER_BYTE = 10  # 8N1: start bit, 8 data bits, stop bit
 
+# Frame CRC states, as stored in the frame index
+CRC_WRONG = 0
+CRC_OK = 1
+CRC_UNKNOWN = 2
 
-def unpack_sting(bytes_list):
-    format = "c" * len(bytes_list)
-    return struct.pack(">{}".format(format), *bytes_list)
+LOG = logging.getLogger(__name__)
 
-
-def list_to_bytes(data):
-    format = "B" * len(data)
-    return struct.pack(">{}".format(format), *data)
+DECODE_ERROR = "decode error"  # field of payloads the decoder failed on
+NOT_DECODED = object()  # field without its own decoder
 
 
 def setup_logging():
@@ -47,7 +69,7 @@ def bytes_to_uint(bytes):
     result = 0
     step = 0
     for i in bytes:
-        result += ord(i) << 8 * (len(bytes) - 1 - step)
+        result += i << 8 * (len(bytes) - 1 - step)
         step += 1
     return result
 
@@ -57,45 +79,44 @@ def bytes_to_list(bytes):
 
 
 class CrsfPayload(object):
-    payload = None
+    """
+    Frame payload, decoded lazily.
+
+    ``get`` and ``[]`` decode only the asked field if the frame type has field decoders
+    (types declared in ``crsf_schema.SCHEMAS``), other types and ``fields`` decode the whole
+    payload on first access. ``raw`` list is only built when asked for.
 
-    def __init__(self, type, payload):
+    ``counters`` (the Reader) gets ``frames_decoded`` and, for decoder errors, ``frames_bad`` counts.
+    """
+    __slots__ = ('type', 'payload_raw', 'decoded', 'values', 'counters')
+
+    def __init__(self, type, payload, counters=None):
         self.type = type
         self.payload_raw = payload
-        self.decode()
+        self.decoded = None
+        self.values = None  # fields decoded one by one
+        self.counters = counters
 
     @staticmethod
     def decode_flight_mode(payload):
         is_armed = True
         end_index = -1
-        if payload[-2] == '*':
+        if payload[-2] == ord('*'):
             is_armed = False
             end_index = -2
         return (
-            ("raw", bytes_to_list(payload)),
-            ("mode", "".join(payload[0:end_index])),
+            ("mode", bytes(payload[0:end_index]).decode('ascii', 'replace')),
             ("is_armed", is_armed)
         )
 
-    @staticmethod
-    def decode_battery_sensor(payload):
-        return (
-            ("raw", bytes_to_list(payload)),
-            ("voltage", float((ord(payload[0]) << 8) + ord(payload[1])) / 10),
-            ("current", float((ord(payload[2]) << 8) + ord(payload[3])) / 10),
-            ("consumption", (ord(payload[4]) << 16) + (ord(payload[5]) << 8) + ord(payload[6])),
-            ("battary procentage", bytes_to_uint(payload[7])),
-        )
-
     @staticmethod
     def decode_unknown_0x38(payload):
         return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
+            ("dst address", lookup_frame_address(payload[0])),
+            ("src address", lookup_frame_address(payload[1])),
             ("payload", bytes_to_list(payload[2:])),
-            ("(test) param1", bytes_to_list(payload[2])),
-            ("(test) param2", bin(bytes_to_uint(payload[3]))),
+            ("(test) param1", payload[2]),
+            ("(test) param2", bin(payload[3])),
             # ("(test) param3", bytes_to_list(payload[4])),  # list index out of range then payload[2] == 4
             ("(test) SEQ NUM", bytes_to_list(payload[5:12]))
         )
@@ -103,185 +124,214 @@ class CrsfPayload(object):
     @staticmethod
     def decode_unknown_0x34(payload):
         return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
+            ("dst address", lookup_frame_address(payload[0])),
+            ("src address", lookup_frame_address(payload[1])),
             ("payload", bytes_to_uint(payload[2:13]))
         )
 
     @staticmethod
     def decode_unknown_0x36(payload):
         return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
+            ("dst address", lookup_frame_address(payload[0])),
+            ("src address", lookup_frame_address(payload[1])),
             ("payload", bytes_to_list(payload[2:]))
         )
 
-    @staticmethod
-    def decode_vtx(payload):
-        return (
-            ("raw", bytes_to_list(payload)),
-            ("src address", CrsfFrameAddress(ord(payload[0]))),
-            ("comm mode", CrsfVtxInterface(ord(payload[0]) >> 5)),
-            ("is VTX available", ord(payload[0]) >> 4 & 1),
-            ("is manual freq", ord(payload[0]) >> 1 & 1),  # TODO: test
-            ("is PitMode", ord(payload[0]) & 1),
-            ("band",  ord(payload[2])),
-            ("manual frequency", bytes_to_uint(payload[3:4])),
-            ("PitMode", CrsfVtxPitmode(ord(payload[5]) >> 4)),
-            ("power", CrsfVtxXPower(ord(payload[5]) & int('111', 2)))
-        )
-
     @staticmethod
     def decode_displayport_cmd(payload):
         return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
-            ("payload", bytes_to_list(payload[1])),
+            ("dst address", lookup_frame_address(payload[0])),
+            ("src address", lookup_frame_address(payload[1])),
+            ("payload", payload[1]),
         )
 
-    @staticmethod
-    def decode_device_ping(payload):
-        return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
-        )
-
-    @staticmethod
-    def decode_device_info(payload):
-        return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
-            ("name", "".join(payload[2:-15])),
-            # Zero byte
-            ("serial number", bytes_to_uint(payload[-14:-10])),
-            ("hardware id", hex(bytes_to_uint(payload[-10:-6]))),  # CrsfHardwareID
-            ("hardware id (decoded)", CrsfHardwareID(bytes_to_uint(payload[-10:-6]) >> 3 << 3)),
-            ("firmware id", bytes_to_uint(payload[-6:-2])),
-            ("parameter count", ord(payload[-2])),
-            ("device info version", ord(payload[-1]))
-        )
-
-    # FIXME
+    # Entry data may span several chunks, they are joined and decoded by crsf_params.ParameterCache
     @staticmethod
     def decode_parameter_settings_entry(payload):
         return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
-            ("parameter number", ord(payload[2])),
-            ("parameter chunks", ord(payload[3])),
-            ("parent folder", ord(payload[4])),
-            ("hidden", bytes_to_uint(payload[5]) >> 7),
-            ("data type", CrsfDataType(ord(payload[5]) % int("10000000", 2))),
-            ("payload", unpack_sting(payload[6:]))  # TODO: Unpack more data
-        )
-
-    @staticmethod
-    def decode_parameter_read(payload):
-        return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
-            ("parameter number", ord(payload[2])),
-            ("parameter chunk number", ord(payload[3]))
+            ("dst address", lookup_frame_address(payload[0])),
+            ("src address", lookup_frame_address(payload[1])),
+            ("parameter number", payload[2]),
+            ("parameter chunks", payload[3]),
+            ("chunk data", bytes_to_list(payload[4:]))
         )
 
     @staticmethod
     def decode_parameter_write(payload):
         return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
-            ("parameter number", ord(payload[2])),
+            ("dst address", lookup_frame_address(payload[0])),
+            ("src address", lookup_frame_address(payload[1])),
+            ("parameter number", payload[2]),
             ("data", bytes_to_list(payload[3:]))
         )
 
     @staticmethod
     def decode_command(payload):
         return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
-            ("command id", CrsfCommandID(ord(payload[2]))),
+            ("dst address", lookup_frame_address(payload[0])),
+            ("src address", lookup_frame_address(payload[1])),
+            ("command id", CrsfCommandID(payload[2])),
             ("command payload", bytes_to_list(payload[3:-1])),
-            ("command crc", ord(payload[-1])),
-            ("calculated crc", calc_crc(list_to_bytes([0x32] + bytes_to_list(payload[0:-1])), 'cmd'))  # FIXME
+            ("command crc", payload[-1]),
+            ("calculated crc", command_crc(payload[0:-1]))
         )
 
     @staticmethod
     def decode_msp_resp(payload):
         return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
+            ("dst address", lookup_frame_address(payload[0])),
+            ("src address", lookup_frame_address(payload[1])),
             ("MSP data raw", bytes_to_list(payload[2:])),
-            ("MSP seq num", int(bytes_to_uint(payload[2]))),
-            ("MSP payload length", int(ord(payload[3]))),
-            ("MSP code", MspCodes(ord(payload[4]))),
-            ("MSP payload", bytes_to_list(payload[5:4 + int(ord(payload[3]))])),
-            ("MSP checksum", bytes_to_list(payload[-1]))
+            ("MSP seq num", payload[2]),
+            ("MSP payload length", int(payload[3])),
+            ("MSP code", lookup_msp_code(payload[4])),
+            ("MSP payload", bytes_to_list(payload[5:4 + int(payload[3])])),
+            ("MSP checksum", payload[-1])
         )
 
     @staticmethod
     def decode_msp_req(payload):
         return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
+            ("dst address", lookup_frame_address(payload[0])),
+            ("src address", lookup_frame_address(payload[1])),
             ("MSP data raw", bytes_to_list(payload[2:])),
-            ("MSP seq num", int(bytes_to_uint(payload[2]))),
-            ("MSP payload length", int(ord(payload[3]))),
-            ("MSP code", MspCodes(ord(payload[4]))),
+            ("MSP seq num", payload[2]),
+            ("MSP payload length", int(payload[3])),
+            ("MSP code", lookup_msp_code(payload[4])),
             ("MSP payload", bytes_to_list(payload[5:-1])),
-            ("MSP checksum", bytes_to_list(payload[-1]))
+            ("MSP checksum", payload[-1])
         )
 
     @staticmethod
     def decode_msp_write(payload):
         return (
-            ("raw", bytes_to_list(payload)),
-            ("dst address", CrsfFrameAddress(ord(payload[0]))),
-            ("src address", CrsfFrameAddress(ord(payload[1]))),
+            ("dst address", lookup_frame_address(payload[0])),
+            ("src address", lookup_frame_address(payload[1])),
             ("MSP data raw", bytes_to_list(payload[2:])),
-            ("MSP seq num", int(bytes_to_uint(payload[2]))),
-            ("MSP payload length", int(ord(payload[3]))),
-            ("MSP code", MspCodes(ord(payload[4]))),
+            ("MSP seq num", payload[2]),
+            ("MSP payload length", int(payload[3])),
+            ("MSP code", lookup_msp_code(payload[4])),
             ("MSP payload", bytes_to_list(payload[5:-1])),
-            ("MSP checksum", bytes_to_list(payload[-1]))
+            ("MSP checksum", payload[-1])
         )
 
     @staticmethod
-    def decode_attitude(payload):
+    def decode_rc_channels_packed(payload):
+        channels = unpack_channels(payload)
         return (
-            ("raw", bytes_to_list(payload)),
-            ("pitch", float((ord(payload[0]) << 8) + ord(payload[1])) / 1000),
-            ("roll", float((ord(payload[2]) << 8) + ord(payload[3])) / 1000),
-            ("yaw", float((ord(payload[4]) << 8) + ord(payload[5])) / 1000)
+            ("channels", channels),
+            ("channels us", [ticks_to_us(i) for i in channels])
         )
 
     @staticmethod
     def decode_other(payload):
-        return (
-            ("raw", bytes_to_list(payload)),
-        )
+        return ()
 
     def decode(self):
-        func_name = "decode_{}".format(self.type.name).lower()
-        if hasattr(self, func_name):
-            decode = getattr(self, func_name)
-            self.payload = decode(self.payload_raw)
-        else:
-            self.payload = self.decode_other(self.payload_raw)
+        decode = DECODERS.get(self.type.value, CrsfPayload.decode_other)
+        try:
+            self.decoded = decode(self.payload_raw)
+            if self.counters is not None and self.values is None:
+                self.counters.frames_decoded += 1
+        except Exception as err:
+            LOG.error("%s - exception while decoding payload %s" % (self.type.name, bytes_to_list(self.payload_raw)))
+            LOG.exception(err)
+            self.decoded = ((DECODE_ERROR, repr(err)),)
+            if self.counters is not None:
+                self.counters.frames_bad += 1
+
+    def decode_field(self, name):
+        """Value of a single field, NOT_DECODED if the type has no decoder for it or it failed."""
+        decoders = FIELD_DECODERS.get(self.type.value)
+        if decoders is None or name not in decoders:
+            return NOT_DECODED
+        if self.values is not None and name in self.values:
+            return self.values[name]
+        try:
+            value = decoders[name](self.payload_raw)
+        except Exception:
+            # The whole payload decoder reports the error
+            return NOT_DECODED
+        if self.values is None:
+            self.values = {}
+            if self.counters is not None:
+                self.counters.frames_decoded += 1
+        self.values[name] = value
+        return value
+
+    @property
+    def failed(self):
+        """True if the decoder raised, ``fields`` then only has the error."""
+        fields = self.fields
+        return len(fields) == 1 and fields[0][0] == DECODE_ERROR
+
+    @property
+    def fields(self):
+        """Decoded (name, value) fields, without raw."""
+        if self.decoded is None:
+            self.decode()
+        return self.decoded
+
+    @property
+    def raw(self):
+        return bytes_to_list(self.payload_raw)
+
+    @property
+    def payload(self):
+        return (("raw", self.raw),) + self.fields
+
+    def get(self, name, default=None):
+        if self.decoded is None:
+            value = self.decode_field(name)
+            if value is not NOT_DECODED:
+                return value
+        for field in self.fields:
+            if field[0] == name:
+                return field[1]
+        return default
+
+    def __getitem__(self, name):
+        if self.decoded is None:
+            value = self.decode_field(name)
+            if value is not NOT_DECODED:
+                return value
+        for field in self.fields:
+            if field[0] == name:
+                return field[1]
+        raise KeyError(name)
 
     def __str__(self):
         return str(self.payload)
 
 
+DECODERS = {}  # frame type byte -> decode function
+FIELD_DECODERS = {}  # frame type byte -> {field name: decode function of the field}
+
+
+def register_decoder(frame_type, func, field_decoders=None):
+    """
+    Set decode function for a frame type (CrsfFrameType or raw type byte).
+
+    Function gets the payload and returns a tuple of (name, value) fields, raw excluded.
+    ``field_decoders`` ({name: function(payload) -> value}) decode single fields for ``CrsfPayload.get``.
+    """
+    type_byte = getattr(frame_type, 'value', frame_type)
+    DECODERS[type_byte] = func
+    if field_decoders:
+        FIELD_DECODERS[type_byte] = field_decoders
+    else:
+        FIELD_DECODERS.pop(type_byte, None)
+
+
+for member in CrsfFrameType:
+    decode = getattr(CrsfPayload, "decode_{}".format(member.name).lower(), None)
+    if decode is not None:
+        register_decoder(member, decode)
+
+for member, fields in SCHEMAS.items():
+    register_decoder(member, compile_schema(fields, "decode_{}".format(member.name).lower()), compile_fields(fields))
+
+
 class CrsfFrame(object):
     raw = None
     address = None
@@ -289,34 +339,49 @@ class CrsfFrame(object):
     frame_type = 0
     payload = None
     crc = None
+    offset = None
+    timestamp = None
+    arrival = None
+    device = None
+    port = None
 
     def unpack(self):
         buf = self.raw
-        self.address = ord(buf[0])
-        self.data_size = ord(buf[1])
-        self.frame_type = ord(buf[2])
+        self.address = buf[0]
+        self.data_size = buf[1]
+        self.frame_type = buf[2]
         self.payload = buf[3:-1]
-        self.crc = ord(buf[-1])
+        self.crc = buf[-1]
 
-    def verify_crc(self):
-        self.crc = CrsfCrc(self.crc, self.raw[2:-1])
+    def verify_crc(self, verified=False):
+        if verified:
+            self.crc = CrsfCrc(self.crc, calculated_crc=self.crc)
+        else:
+            self.crc = CrsfCrc(self.crc, self.raw[2:-1])
 
     def verify_zero(self):
         if self.data_size == 0 and self.frame_type == 0 and self.crc.calculated_crc == 0:
             return False
         return True
 
-    def decode(self):
-        self.address = CrsfFrameAddress(self.address)
-        self.data_size = ord(self.raw[1])
-        self.frame_type = CrsfFrameType(self.frame_type)
-        self.payload = CrsfPayload(self.frame_type, self.payload)
+    def decode(self, counters=None):
+        self.address = lookup_frame_address(self.address)
+        self.data_size = self.raw[1]
+        self.frame_type = lookup_frame_type(self.frame_type)
+        self.payload = CrsfPayload(self.frame_type, self.payload, counters)
 
     def __str__(self):
         return "Data size: {}; Data type: {}; " \
                "Payload: {}; CRC: {};".format(self.data_size, self.frame_type.name,
                                               self.payload, self.crc)
 
+    def detach(self):
+        """Replace views of the source buffer with own copies, so the frame can outlive it or be pickled."""
+        self.raw = bytes(self.raw)
+        self.payload.payload_raw = bytes(self.payload.payload_raw)
+        self.payload.counters = None
+        return self
+
     @property
     def fields(self):
         return (
@@ -329,6 +394,20 @@ class CrsfFrame(object):
         )
 
 
+def make_type_filter(show_types=None, skip_types=None):
+    """
+    256 items list of flags telling if a frame type byte passes the filter, None if nothing is filtered.
+
+    Types are CrsfFrameType members or raw type bytes.
+    """
+    if not show_types and not skip_types:
+        return None
+
+    show_types = set(getattr(i, 'value', i) for i in show_types or [])
+    skip_types = set(getattr(i, 'value', i) for i in skip_types or [])
+    return [(not show_types or i in show_types) and i not in skip_types for i in range(256)]
+
+
 class Reader(object):
     bytes_skipped = 0
     bytes_total = 0
@@ -340,25 +419,54 @@ class Reader(object):
     crc_wrong = 0
     crc_ok = 0
 
-    def __init__(self, reader_type='file', path=None, raw_log=None, baudrate=420000, raw_log_path=None):
+    frames_filtered = 0
+
+    def __init__(self, reader_type='file', path=None, raw_log=None, baudrate=420000, raw_log_path=None,
+                 show_types=None, skip_types=None, filtered_crc=True, index=None,
+                 raw_log_format='binlog', raw_log_compress=False, clock=time.time):
         self.reader_type = reader_type
         self.reader_path = path
         self.reader = None
+        self.capture = False
 
         self.raw_log_path = raw_log_path
+        self.raw_log_format = raw_log_format
+        self.raw_log_compress = raw_log_compress
         self.raw_log = None
 
         self.baudrate = baudrate
+        # Timestamps of serial frames
+        self.clock = clock
+        # Wire time of one byte, to estimate when a frame arrived from the time its chunk was read
+        self.byte_time = float(BITS_PER_BYTE) / int(baudrate)
+
+        # Type byte -> frame wanted, checked before the frame is decoded
+        self.type_filter = make_type_filter(show_types, skip_types)
+        self.filtered_crc = filtered_crc
+
+        # Frame index writer (crsf_index.IndexWriter), filled while scanning
+        self.index = index
 
         self.__init_raw_log()
         self.__open_reader()
 
     def __init_raw_log(self):
-        if self.raw_log_path is not None:
+        # Mapped file is already a raw log, copying it would defeat the mapping
+        if self.raw_log_path is None or self.reader_type == 'mmap':
+            return
+        if self.raw_log_format == 'capture':
+            # Timestamped, written from a background thread
+            self.raw_log = CaptureWriter(self.raw_log_path, compress=self.raw_log_compress)
+        else:
             self.raw_log = open(self.raw_log_path, 'wb')
 
     def __open_reader(self):
-        if self.reader_type == 'file':
+        if self.reader_type in ['file', 'mmap'] and is_capture(self.reader_path):
+            # Captures are chunked and may be compressed, so they are always read as a stream
+            self.reader_type = 'file'
+            self.reader = CaptureFile(self.reader_path)
+            self.capture = True
+        elif self.reader_type == 'file':
             self.reader = open(self.reader_path, 'rb')
         elif self.reader_type == 'serial':
             self.reader = serial.Serial()
@@ -366,100 +474,303 @@ class Reader(object):
             self.reader.baudrate = int(self.baudrate)
             # self.reader.timeout(1)
             self.reader.open()
+        elif self.reader_type == 'mmap':
+            self.reader_file = open(self.reader_path, 'rb')
+            if os.fstat(self.reader_file.fileno()).st_size == 0:
+                self.reader = b''
+                return
+            self.reader = mmap.mmap(self.reader_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(self.reader, 'madvise'):
+                self.reader.madvise(mmap.MADV_SEQUENTIAL)
         else:
             print("Unknown reader type")
             sys.exit(1)
 
     def close(self):
-        if self.raw_log_path is not None:
+        if self.index is not None:
+            # Not finished by read_frames, so the scan was interrupted
+            self.index.abort()
+        if self.raw_log is not None:
             self.raw_log.close()
         if self.reader_type in ['file', 'serial']:
             self.reader.close()
+        elif self.reader_type == 'mmap':
+            try:
+                if self.reader:
+                    self.reader.close()
+            except BufferError:
+                # Frames still hold views of the map, it is released with them
+                pass
+            self.reader_file.close()
 
     def read_data(self, length=1):
         if length <= 0:
-            return ''
+            return b''
 
-        self.bytes_total += length
         data = self.reader.read(length)
+        self.bytes_total += len(data)
 
         if self.raw_log:
             self.raw_log.write(data)
 
         return data
 
-    def read_frame(self, address=None):
-        self.frames_total += 1
-        LOG.debug("%s - Reading frame" % self.frames_total)
+    def read_into(self, view):
+        """Fill ``view`` with as many bytes as the source can give, returns the byte count."""
+        if self.reader_type == 'serial':
+            # Do not block for a whole chunk, take what is already in the UART buffer
+            view = view[:min(max(self.reader.in_waiting, 1), len(view))]
+
+        count = self.reader.readinto(view) or 0
+        self.bytes_total += count
+
+        if self.raw_log and count:
+            self.raw_log.write(view[:count])
+
+        return count
+
+    def read_frames(self, start=0, stop=None):
+        """
+        Scan the source in CHUNK_SIZE blocks and yield decoded frames.
+
+        Unconsumed tail of the previous chunk is moved to the head of a reusable buffer,
+        so frames crossing chunk boundaries are handled.
+
+        In mmap mode the whole mapping (or frames starting in its [start, stop) range) is scanned
+        in place and frames get memoryview slices of it instead of copies.
+        """
+        if self.reader_type == 'mmap':
+            end = len(self.reader)
+            stop = end if stop is None else stop
+            self.bytes_total += stop - start
+            yield from self.scan_buffer(self.reader, start, end, eof=True, copy=False, stop=stop)
+            self.__finish_index()
+            return
+
+        buf = bytearray(CHUNK_SIZE + MAX_FRAME_SYZE + 2)
+        view = memoryview(buf)
+        pos = end = 0
+        base = self.bytes_total  # source offset of buf[0]
 
-        buf = [address]
-        buf += self.read_data(1)  # length
-        if ord(buf[1]) > MAX_FRAME_SYZE:
-            return None
+        while True:
+            tail = end - pos
+            buf[:tail] = view[pos:end]
+            base += pos
+            pos, end = 0, tail
+
+            count = self.read_into(view[end:end + CHUNK_SIZE])
+            if self.reader_type == 'serial':
+                read_time = self.clock()
+            elif self.capture:
+                read_time = self.reader.timestamp
+            else:
+                read_time = None
+            end += count
 
-        buf += self.read_data(1)  # type
-        buf += self.read_data(ord(buf[1]) - 2)  # payload
-        buf += self.read_data(1)  # crc
+            pos = yield from self.scan_buffer(buf, pos, end, eof=count == 0, base=base, read_time=read_time)
+            if count == 0:
+                break
+        self.__finish_index()
+
+    def __finish_index(self):
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+    def scan_buffer(self, buf, pos, end, eof=False, base=0, read_time=None, copy=True, stop=None):
+        """
+        Yield frames found in buf[pos:end] (bytearray, bytes or mmap).
+
+        After a bad length or CRC the scan restarts right after the rejected sync byte.
+        Returns the offset of the first unconsumed byte, which starts an incomplete
+        frame, unless ``eof`` is set. ``base`` is the source offset of buf[0].
+        With ``stop`` only frames starting before it are read, the last one may end after it.
+
+        With numpy, CRCs of all frame candidates in CRC_WINDOW bytes ahead of the scan
+        are verified with one verify_crc_batch call and looked up as the scan reaches them.
+        """
+        view = memoryview(buf)
+        crc_results = {}  # frame start -> CRC matches
+        limit = end if stop is None else stop
+        while True:
+            if pos >= limit:
+                return pos
+            start = buf.find(SYNC, pos, limit)
+            if start < 0:
+                self.bytes_skipped += limit - pos
+                return limit
+
+            self.bytes_skipped += start - pos
+            pos = start
+            if end - pos < 2:
+                return end if eof else pos
+
+            size = buf[pos + 1]
+            frame_end = pos + size + 2
+            valid_size = 2 <= size <= MAX_FRAME_SYZE
+            if valid_size and frame_end > end and not eof:
+                return pos
+
+            self.frames_total += 1
+            LOG.debug("%s - Reading frame", self.frames_total)
+            if not valid_size or frame_end > end:
+                pos += 1
+                continue
+
+            wanted = self.type_filter is None or self.type_filter[buf[pos + 2]]
+            if wanted or self.filtered_crc:
+                crc_ok = crc_results.get(pos)
+                if crc_ok is None:
+                    if np is not None:
+                        crc_results = self.verify_window(buf, pos, end)
+                        crc_ok = crc_results[pos]
+                    else:
+                        crc_ok = crc8(view[pos + 2:frame_end - 1]) == buf[frame_end - 1]
+                if not crc_ok:
+                    LOG.error("Frame #%s - wrong CRC", self.frames_total)
+                    self.frames_bad += 1
+                    self.crc_wrong += 1
+                    if self.index is not None:
+                        self.index.add(base + pos, size + 2, buf[pos + 2], CRC_WRONG, read_time)
+                    pos += 1
+                    continue
 
+            if not wanted:
+                crc_state = CRC_UNKNOWN
+                if self.filtered_crc:
+                    self.crc_ok += 1
+                    crc_state = CRC_OK
+                if self.index is not None:
+                    self.index.add(base + pos, size + 2, buf[pos + 2], crc_state, read_time)
+                self.frames_filtered += 1
+                pos = frame_end
+                continue
+
+            frame = self.read_frame(bytes(view[pos:frame_end]) if copy else view[pos:frame_end], crc_verified=True)
+            if self.index is not None:
+                self.index.add(base + pos, size + 2, buf[pos + 2], CRC_WRONG if frame is False else CRC_OK, read_time)
+            if frame is False:
+                pos += 1
+                continue
+
+            if frame is not None:
+                frame.offset = base + pos
+                frame.timestamp = read_time
+                if read_time is not None:
+                    # The last byte of the chunk came at read time, bytes before it one byte time apart
+                    frame.arrival = read_time - (end - frame_end) * self.byte_time
+                pos = frame_end
+                yield frame
+            else:
+                pos = frame_end
+
+    def verify_window(self, buf, pos, end):
+        """
+        CRC results of every frame candidate (sync byte, valid size, complete) starting
+        in the CRC_WINDOW bytes from ``pos``, as {frame start: CRC matches}.
+
+        Sync bytes inside payloads are verified too, that is cheaper than following
+        frame boundaries in Python. Frames filtered out without CRC verification are left out.
+        """
+        data = np.frombuffer(buf, dtype=np.uint8)[:end]
+        starts = np.flatnonzero(data[pos:min(pos + CRC_WINDOW, end - 1)] == SYNC_BYTE) + pos
+        sizes = data[starts + 1].astype(np.int64)
+        ends = starts + sizes + 2
+        keep = (sizes >= 2) & (sizes <= MAX_FRAME_SYZE) & (ends <= end)
+        starts, ends = starts[keep], ends[keep]
+        if not self.filtered_crc and self.type_filter is not None:
+            keep = np.array(self.type_filter)[data[starts + 2]]
+            starts, ends = starts[keep], ends[keep]
+        return dict(zip(starts.tolist(), verify_crc_batch(buf, np.column_stack((starts, ends)))))
+
+    def read_frame(self, raw, crc_verified=False):
+        """
+        Verify and decode a single raw frame (sync byte included).
+
+        Returns the frame, None if it was dropped or failed to decode,
+        and False on a CRC mismatch, so the caller can resync.
+        ``crc_verified`` skips the CRC computation for a frame the caller already verified.
+        """
         try:
             frame = CrsfFrame()
-            frame.raw = buf
+            frame.raw = raw
             frame.unpack()
-            frame.verify_crc()
+            frame.verify_crc(crc_verified)
             if not frame.crc.verify():
-                LOG.error("Frame #%s - wrong CRC" % self.frames_total)
+                LOG.error("Frame #%s - wrong CRC", self.frames_total)
                 self.frames_bad += 1
                 self.crc_wrong += 1
-                return None
+                return False
             elif not frame.verify_zero():
-                LOG.debug("Frame #%s - Zero frame" % self.frames_total)
-                return None
-            elif frame in skip_types:
+                LOG.debug("Frame #%s - Zero frame", self.frames_total)
                 return None
 
             self.crc_ok += 1
-            LOG.debug("Frame #%s - crc ok" % self.frames_total)
-            frame.decode()
-            self.frames_decoded += 1
+            LOG.debug("Frame #%s - crc ok", self.frames_total)
+            # Payload is decoded when used, it counts frames_decoded then
+            frame.decode(self)
             return frame
 
         except Exception as err:
             self.frames_bad += 1
-            LOG.error("Frame #%s - exception while reading/decoding frame" % self.frames_total)
-            LOG.info(bytes_to_list(buf))
+            LOG.error("Frame #%s - exception while reading/decoding frame", self.frames_total)
+            LOG.info(bytes_to_list(raw))
             LOG.exception(err)
 
 
+def frame_numbers(value):
+    try:
+        return [int(i) for i in value.split(',') if i.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError("Comma separated frame numbers expected: %s" % value)
+
+
 def parse_args():
     parser = argparse.ArgumentParser(description='Script for parsing Crossfire protocol')
-    parser.add_argument('--type', choices=['serial', 'file'], default='file')
+    parser.add_argument('--type', choices=['serial', 'file', 'mmap'], default='file')
     parser.add_argument("--path", action="store", required=True, help="path")
     parser.add_argument("--baudrate", action="store", help="read serial", default=420000)
     parser.add_argument("--show_types", action="store", help="Show specific frame types")
     parser.add_argument("--skip_types", action="store", help="Skip specific frame types")
+    parser.add_argument("--no_filtered_crc", action="store_true", help="Do not verify CRC of filtered out frames")
     parser.add_argument("--extended_view", action="store_true", help="Extended view")
     parser.add_argument("--debug", action="store_true", help="debug level")
+    parser.add_argument("--raw_log_format", choices=['binlog', 'capture'], default='binlog',
+                        help="Raw log format, capture keeps read timestamps")
+    parser.add_argument("--compress_log", action="store_true", help="Compress capture raw log")
+    parser.add_argument("--output", action="store", help="Write frames to file ('-' for stdout) from a background thread")
+    parser.add_argument("--output_format", choices=OUTPUT_FORMATS, default='text', help="Output format")
+    parser.add_argument("--msp", action="store_true", help="Reassemble and show MSP messages")
+    parser.add_argument("--params", action="store_true", help="Collect parameter menus and show them at the end")
+    parser.add_argument("--devices", action="store_true", help="Show devices seen on the bus and their traffic")
+    parser.add_argument("--sessions", action="store", nargs='?', const='-',
+                        help="Split into sessions and flights, write JSON summaries to file ('-' or no value - log)")
+    parser.add_argument("--hops", action="store_true",
+                        help="Measure latency of frames seen on several ports (--type serial, --path a,b,...)")
+    parser.add_argument("--serve", action="store",
+                        help="Publish frames to clients on tcp:<host>:<port>, udp:<host>:<port>, unix:<path>, "
+                             "comma separated")
+    parser.add_argument("--serve_format", choices=['json', 'binary', 'text'], default='json',
+                        help="Format of published frames")
+    parser.add_argument("--serve_policy", choices=['drop', 'coalesce'], default='drop',
+                        help="Slow clients lose the oldest frames or get only the latest frame of every type")
+    parser.add_argument("--shm", action="store",
+                        help="Publish latest values and recent frames to a shared memory segment with this name")
+    parser.add_argument("--stats", action="store", type=float, help="Print live statistics every N seconds")
+    parser.add_argument("--index", action="store_true", help="Write frame index next to the file")
+    parser.add_argument("--frames", action="store", type=frame_numbers,
+                        help="Show only specific frame numbers, using the index")
+    parser.add_argument("--jobs", action="store", type=int, default=1, help="Parse file with N processes")
+    parser.add_argument("--export", action="store", help="Export decoded frames to directory")
+    parser.add_argument("--export_format", choices=EXPORT_FORMATS, default='parquet', help="Export format")
     # parser.add_argument("--raw-log", action="store", help="raw log path")
 
     return parser.parse_args()
 
 
 def print_frame(frame):
-    LOG.info("==========New frame===========")
-
-    for field in frame.fields:
-        if hasattr(field[1], 'payload'):
-            LOG.info("payload:")
-            for j in getattr(field[1], 'payload'):
-                name = j[0]
-                value = j[1]
-                if isinstance(value, Enum) and hasattr(value, 'name'):
-                    value = getattr(value, 'name')
-                LOG.info("  %s: %s" % (name, value))
-        elif hasattr(field[1], 'name'):
-            LOG.info("%s: %s" % (field[0], field[1].name))
-        else:
-            LOG.info("%s: %s" % (field[0], field[1]))
+    for line in frame_lines(frame):
+        LOG.info(line)
 
 
 if __name__ == "__main__":
@@ -481,32 +792,137 @@ if __name__ == "__main__":
     if args.debug:
         LOG.setLevel(logging.DEBUG)
 
-    reader = Reader(args.type, path=args.path, baudrate=args.baudrate, raw_log_path=".binlog")
+    # crsf_parallel, crsf_index, crsf_multiport and crsf_server are imported here,
+    # they import this module themselves
+    indexed_log = None
+    if args.frames and args.type != 'serial':
+        from crsf_index import IndexedLog
+        indexed_log = IndexedLog(args.path, show_types=show_types, skip_types=skip_types)
+        reader = indexed_log.reader
+        count = len(indexed_log)
+        missing = [i for i in args.frames if not -count <= i < count]
+        if missing:
+            LOG.warning("Frames not in the log (%s frames): %s" % (count, ",".join(str(i) for i in missing)))
+        frames = indexed_log.frames(i for i in args.frames if -count <= i < count)
+    elif args.type == 'serial' and ',' in args.path:
+        from crsf_multiport import MultiPortReader
+        paths = args.path.split(',')
+        ext = ".binlog" if args.raw_log_format == 'binlog' else ".crsfcap"
+        raw_log_paths = [".%s%s" % (i, ext) for i in range(len(paths))]
+        reader = MultiPortReader(paths, baudrate=args.baudrate, raw_log_paths=raw_log_paths,
+                                 raw_log_format=args.raw_log_format, raw_log_compress=args.compress_log,
+                                 show_types=show_types, skip_types=skip_types, filtered_crc=not args.no_filtered_crc)
+        frames = reader.read_frames()
+    elif args.jobs > 1 and args.type != 'serial':
+        from crsf_parallel import ParallelReader
+        reader = ParallelReader(args.path, jobs=args.jobs, show_types=show_types, skip_types=skip_types,
+                                filtered_crc=not args.no_filtered_crc)
+        frames = reader.read_frames()
+    else:
+        index = None
+        if args.index and args.type != 'serial':
+            from crsf_index import IndexWriter
+            index = IndexWriter(args.path)
+        reader = Reader(args.type, path=args.path, baudrate=args.baudrate,
+                        raw_log_path=".binlog" if args.raw_log_format == 'binlog' else ".crsfcap",
+                        raw_log_format=args.raw_log_format, raw_log_compress=args.compress_log,
+                        show_types=show_types, skip_types=skip_types, filtered_crc=not args.no_filtered_crc,
+                        index=index)
+        frames = reader.read_frames()
+    exporter = ColumnarExporter(args.export, args.export_format) if args.export else None
+    # Serial data can not wait for the output, file reading can
+    sink = OutputSink(args.output, args.output_format, drop=args.type == 'serial') if args.output else None
+
+    server = None
+    if args.serve:
+        from crsf_server import FrameServer
+        server = FrameServer(args.serve.split(','), args.serve_format, policy=args.serve_policy,
+                             drop=args.type == 'serial')
+    shared_state = SharedState(args.shm, create=True) if args.shm else None
+
+    msp = MspReassembler() if args.msp else None
+    params = ParameterCache() if args.params else None
+    devices = DeviceRegistry() if args.devices else None
+    sessions = SessionAnalyzer() if args.sessions else None
+    hops = None
+    if args.hops:
+        from crsf_multiport import HopMatcher
+        hops = HopMatcher()
+    sessions_file = open(args.sessions, 'w') if args.sessions and args.sessions != '-' else None
+
+    def write_summary(summary):
+        if summary is None:
+            return
+        line = json.dumps(summary, sort_keys=True)
+        if sessions_file is not None:
+            sessions_file.write(line + "\n")
+        else:
+            LOG.info("Segment %s" % line)
 
-    try:
-        while True:
-            byte = reader.read_data()
-            if byte == "":
-                break
-            # elif bytes_to_uint(byte) in [CrsfFrameAddress(e).value for e in CrsfFrameAddress.__members__.values()]:
-            elif ord(byte) == SYNC_BYTE:
-                frame = reader.read_frame(address=byte)
-                if frame is None:
-                    continue
-                if frame.frame_type not in show_types and len(show_types) > 0:
-                    continue
-                if frame.frame_type in skip_types:
-                    continue
+    stats = None
+    if args.stats:
+        stats = LiveStats(reader, interval=args.stats, log=LOG)
+        stats.instrument(DECODERS)
+        stats.start()
 
-                if args.extended_view:
-                    print_frame(frame)
-                else:
-                    LOG.info(frame)
+    try:
+        for frame in frames:
+            if stats is not None:
+                stats.update(frame)
+            if devices is not None:
+                devices.add_frame(frame)
+            if sessions is not None:
+                write_summary(sessions.add_frame(frame))
+            if hops is not None and frame.port is not None:
+                hops.add_frame(frame)
+            if msp is not None:
+                message = msp.add_frame(frame)
+                if message is not None:
+                    LOG.info(message)
+            if params is not None:
+                parameter = params.add_frame(frame)
+                if parameter is not None:
+                    LOG.info("Parameter %s" % parameter)
+            if server is not None:
+                server.publish(frame)
+            if shared_state is not None:
+                shared_state.publish(frame)
+            if exporter is not None:
+                exporter.add(frame)
+            elif sink is not None:
+                sink.put(frame)
+            elif args.extended_view:
+                print_frame(frame)
             else:
-                reader.bytes_skipped += 1
+                LOG.info(frame)
     except KeyboardInterrupt as err:
         print(err)
-    reader.close()
+    if stats is not None:
+        stats.stop()
+    if sessions is not None:
+        write_summary(sessions.close())
+        if sessions_file is not None:
+            sessions_file.close()
+    if sink is not None:
+        sink.close()
+        if sink.frames_dropped:
+            print("Frames dropped by output: %s" % sink.frames_dropped)
+    if server is not None:
+        server.close()
+        if server.frames_dropped:
+            print("Frames dropped by server: %s" % server.frames_dropped)
+    if shared_state is not None:
+        shared_state.close()
+    if indexed_log is not None:
+        indexed_log.close()
+    else:
+        reader.close()
+    if exporter is not None:
+        exporter.close()
+        if exporter.frames_skipped:
+            print("Frames not exported (decode error): %s" % exporter.frames_skipped)
+        if exporter.values_dropped:
+            print("Values not exported (type differs from earlier values): %s" % exporter.values_dropped)
 
     print("Bytes skipped: %s" % reader.bytes_skipped)
     print("Bytes total: %s" % reader.bytes_total)
@@ -515,3 +931,29 @@ if __name__ == "__main__":
     print("Frames total: %s" % reader.frames_total)
     print("CRC wrong: %s" % reader.crc_wrong)
     print("CRC ok: %s" % reader.crc_ok)
+    print("Frames filtered: %s" % reader.frames_filtered)
+    if devices is not None:
+        for device in devices:
+            print("Device %s: %s frames, %s bytes" % (device, device.frames, device.bytes))
+            for frame_type, count in sorted(device.type_counts().items(), key=lambda i: -i[1]):
+                print("  %s: %s" % (getattr(frame_type, 'name', frame_type), count))
+    if hops is not None:
+        for (source, target), latency in sorted(hops.summary().items()):
+            print("Hop %s -> %s: %s frames, latency mean %.3fms, min %.3fms, max %.3fms" % (
+                paths[source], paths[target], latency['count'],
+                latency['mean'] * 1000, latency['min'] * 1000, latency['max'] * 1000))
+    if params is not None:
+        for address, device in sorted(params.devices.items()):
+            if not device.parameters and not device.chunks_dropped:
+                # Only read from, no entries seen
+                continue
+            print("Parameters of %s:" % getattr(lookup_or_value(lookup_frame_address, address), 'name', address))
+            for depth, parameter in device.walk():
+                print("%s%s: %s" % ("  " * (depth + 1), parameter.name, parameter.value))
+            if device.chunks_dropped:
+                print("  Chunks without their first chunk: %s" % device.chunks_dropped)
+    if msp is not None:
+        print("MSP messages: %s" % msp.messages_ok)
+        print("MSP checksum errors: %s" % msp.checksum_errors)
+        print("MSP chunks dropped: %s" % msp.chunks_dropped)
+        print("MSP messages expired: %s" % msp.messages_expired)
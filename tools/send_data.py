@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+import os
+import tty
+import time
+import select
+import socket
+import argparse
+
+import serial
+
+from read_data import setup_logging
+from crsf_capture import CaptureFile, is_capture
+
+
+BITS_PER_BYTE = 10  # 8N1: start bit, 8 data bits, stop bit
+BLOCK_SIZE = 64
+
+
+class PtySink(object):
+    """
+    Pseudo-terminal, ``name`` is the slave side to open as a serial port.
+
+    The slave is in raw mode, so bytes like 0x0D/0x0A are not rewritten. Only the reader
+    keeps it open, ``wait_for_reader`` tells when it did (bytes written before are lost,
+    serial ports flush their input when opened).
+    """
+
+    def __init__(self):
+        self.master, slave = os.openpty()
+        self.name = os.ttyname(slave)
+        tty.setraw(slave)
+        # Settings stay while the master is open, the master gets POLLHUP while no one has the slave open
+        os.close(slave)
+
+    def wait_for_reader(self, timeout=None, settle=0.2):
+        """
+        Wait until the slave is opened, then ``settle`` seconds more for the reader to set it up.
+
+        Returns False on timeout.
+        """
+        poller = select.poll()
+        poller.register(self.master, select.POLLIN)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while any(events & select.POLLHUP for _, events in poller.poll(0)):
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        time.sleep(settle)
+        return True
+
+    def write(self, data):
+        os.write(self.master, data)
+
+    def close(self):
+        os.close(self.master)
+
+
+class SocketSink(object):
+    def __init__(self, kind, host, port):
+        self.address = (host, int(port))
+        self.name = "%s:%s:%s" % (kind, host, port)
+        if kind == 'udp':
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            self.socket = socket.create_connection(self.address)
+        self.kind = kind
+
+    def write(self, data):
+        if self.kind == 'udp':
+            self.socket.sendto(data, self.address)
+        else:
+            self.socket.sendall(data)
+
+    def close(self):
+        self.socket.close()
+
+
+class SerialSink(object):
+    def __init__(self, path, baudrate):
+        self.name = path
+        self.port = serial.Serial(path, int(baudrate))
+
+    def write(self, data):
+        self.port.write(data)
+
+    def close(self):
+        self.port.close()
+
+
+def open_sink(output, baudrate):
+    """``pty``, ``tcp:<host>:<port>``, ``udp:<host>:<port>`` or a serial port path."""
+    if output == 'pty':
+        return PtySink()
+    if output.startswith('tcp:') or output.startswith('udp:'):
+        return SocketSink(*output.split(':', 2))
+    return SerialSink(output, baudrate)
+
+
+def read_blocks(path, baudrate, block_size=BLOCK_SIZE):
+    """
+    (time offset in seconds, bytes) of every block to send.
+
+    Captures keep their recorded timing, plain binary logs are paced
+    by the time the bytes take on the wire at ``baudrate``.
+    """
+    if is_capture(path):
+        capture = CaptureFile(path)
+        try:
+            start = None
+            for timestamp_ns, data in capture.blocks():
+                if start is None:
+                    start = timestamp_ns
+                yield (timestamp_ns - start) / 1e9, data
+        finally:
+            capture.close()
+        return
+
+    byte_time = float(BITS_PER_BYTE) / int(baudrate)
+    sent = 0
+    with open(path, 'rb') as source:
+        while True:
+            data = source.read(block_size)
+            if not data:
+                break
+            yield sent * byte_time, data
+            sent += len(data)
+
+
+def replay(path, sink, baudrate=420000, speed=1.0, block_size=BLOCK_SIZE):
+    """
+    Send the log to ``sink``, ``speed`` times faster than recorded (0 - no pacing).
+
+    Every block is scheduled against the replay start, so sleep errors do not accumulate.
+    Returns number of bytes sent.
+    """
+    sent = 0
+    start = time.monotonic()
+    for offset, data in read_blocks(path, baudrate, block_size):
+        if speed > 0:
+            delay = start + offset / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        sink.write(data)
+        sent += len(data)
+    return sent
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Script for replaying Crossfire protocol logs')
+    parser.add_argument("--path", action="store", required=True, help="Binary log or capture file")
+    parser.add_argument("--output", action="store", default='pty',
+                        help="pty, tcp:<host>:<port>, udp:<host>:<port> or serial port")
+    parser.add_argument("--baudrate", action="store", help="Link speed", default=420000)
+    parser.add_argument("--speed", action="store", type=float, default=1.0, help="Replay speed, 0 - no pacing")
+    parser.add_argument("--block_size", action="store", type=int, default=BLOCK_SIZE,
+                        help="Bytes per write for binary logs")
+    parser.add_argument("--loop", action="store_true", help="Replay forever")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    LOG = setup_logging()
+
+    sink = open_sink(args.output, args.baudrate)
+    if isinstance(sink, PtySink):
+        LOG.info("Waiting for a reader on %s" % sink.name)
+        sink.wait_for_reader()
+    LOG.info("Replaying %s to %s" % (args.path, sink.name))
+
+    try:
+        while True:
+            started = time.monotonic()
+            sent = replay(args.path, sink, args.baudrate, args.speed, args.block_size)
+            LOG.info("Sent %s bytes in %.3fs" % (sent, time.monotonic() - started))
+            if not args.loop:
+                break
+    except KeyboardInterrupt as err:
+        print(err)
+    sink.close()
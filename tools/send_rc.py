@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+import time
+import argparse
+
+from read_data import setup_logging
+from send_data import open_sink, PtySink
+from crsf_encoder import FrameEncoder, Transmitter
+from crsf_channels import us_to_ticks, CHANNELS_COUNT
+
+
+RATE = 500  # Hz
+
+
+def parse_channels(value):
+    """Comma separated channel values in us, missing channels are centered."""
+    channels = [int(i) for i in value.split(',') if i] if value else []
+    if len(channels) > CHANNELS_COUNT:
+        raise argparse.ArgumentTypeError("At most %s channels" % CHANNELS_COUNT)
+    return [us_to_ticks(i) for i in channels + [1500] * (CHANNELS_COUNT - len(channels))]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Script for sending Crossfire RC frames at a fixed rate')
+    parser.add_argument("--output", action="store", default='pty',
+                        help="pty, tcp:<host>:<port>, udp:<host>:<port> or serial port")
+    parser.add_argument("--baudrate", action="store", help="Link speed", default=420000)
+    parser.add_argument("--rate", action="store", type=float, default=RATE, help="RC frames per second")
+    parser.add_argument("--channels", action="store", type=parse_channels, default=parse_channels(''),
+                        help="Channel values in us, comma separated")
+    parser.add_argument("--duration", action="store", type=float, help="Seconds to send, forever if not set")
+    parser.add_argument("--ping", action="store_true", help="Send DEVICE_PING before RC frames")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    LOG = setup_logging()
+
+    sink = open_sink(args.output, args.baudrate)
+    if isinstance(sink, PtySink):
+        LOG.info("Waiting for a reader on %s" % sink.name)
+        sink.wait_for_reader()
+    encoder = FrameEncoder()
+    transmitter = Transmitter(sink, args.rate)
+    LOG.info("Sending RC frames to %s at %s Hz" % (sink.name, args.rate))
+
+    if args.ping:
+        sink.write(encoder.device_ping())
+
+    channels = args.channels
+    started = time.monotonic()
+    try:
+        transmitter.run(lambda slot: encoder.rc_channels(channels), args.duration)
+    except KeyboardInterrupt as err:
+        print(err)
+    sink.close()
+
+    LOG.info("Sent %s frames in %.3fs, missed %s, max late %.3fms" % (
+        transmitter.frames_sent, time.monotonic() - started, transmitter.frames_missed, transmitter.max_late * 1000))